@@ -0,0 +1,285 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
+from RandomStreams import spawnSeeds
+
+PRODUCTS = ['FWB', 'Plasma']
+METRICS = ['TransDays', 'TransSpace', 'FWBUnmet', 'PlasmaUnmet', 'FWBExpired', 'PlasmaExpired']
+STORAGES = ['BloodProductStorage', 'BucketProductStorage']
+# inputs of each simulation type, the per-platoon ones must have an entry for each of the n platoons
+TF_PLATOON_INPUTS = ['l', 'avgOrderInterval', 'maxOrderInterval', 'TargetInv', 'PI', 'CLMatrix']
+QR_PLATOON_INPUTS = ['l', 'I', 'CLMatrix']
+
+def readScenarios(path):
+    """ Streams the scenarios of a JSONL file one line at a time, so files of any length are never held in memory.
+        Blank lines are skipped, a scenario without an id is named after its line number.
+        Yields :
+        (id, record) pairs, record is None when the line is not a JSON object """
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield 'line-' + str(number), None
+                continue
+            if not isinstance(record, dict):
+                yield 'line-' + str(number), None
+                continue
+            yield str(record.get('id', 'line-' + str(number))), record
+
+def completedIds(path):
+    """ Returns the ids of the scenarios a results file already holds a successful result of. Invalid and failed
+        scenarios are left out so they are validated and run again, e.g. after being fixed in place """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue # a line cut short when an earlier sweep was killed
+            if isinstance(record, dict) and record.get('status') == 'ok':
+                done.add(str(record['id']))
+    return done
+
+def _require(record, name, kind):
+    if name not in record:
+        raise ValueError('missing input ' + name)
+    value = record[name]
+    if kind == int and (isinstance(value, bool) or not isinstance(value, int)):
+        raise ValueError(f'{name} must be an integer')
+    if kind == list and not isinstance(value, list):
+        raise ValueError(f'{name} must be a list')
+    return value
+
+def _isInt(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def _isProbability(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value >= 0
+
+def _combatLevels(entry, i):
+    """ Validates the CLMatrix entry of platoon i: level probabilities summing to at most 1, the rest going to the level
+        after the last as the engines draw it, or Streamlit conflict ranges
+        {'Days': 'first-last', 'Dist': weights} that are turned into a CombatSchedule.PiecewiseSchedule """
+    if not isinstance(entry, list) or len(entry) == 0:
+        raise ValueError(f'CLMatrix entry {i} must be a list of non-negative probabilities or of day ranges')
+    if all(isinstance(item, dict) for item in entry):
+        for item in entry:
+            days = str(item.get('Days', '')).split('-')
+            if len(days) != 2 or not all(d.strip().isdigit() for d in days):
+                raise ValueError(f"CLMatrix entry {i} has a day range without 'Days' of the form 'first-last'")
+            if not isinstance(item.get('Dist'), list) or not all(_isProbability(w) for w in item['Dist']):
+                raise ValueError(f"CLMatrix entry {i} has a day range without a 'Dist' list of non-negative weights")
+        from CombatSchedule import fromRanges
+        return fromRanges(entry)
+    if not all(_isProbability(p) for p in entry):
+        raise ValueError(f'CLMatrix entry {i} must be a list of non-negative probabilities or of day ranges')
+    if sum(entry) > 1 + 1e-6:
+        raise ValueError(f'CLMatrix entry {i} sums to {sum(entry)}, more than 1')
+    return entry
+
+def _lots(lots, name, productIndex, unitsIndex, expiresIndex):
+    if not isinstance(lots, list):
+        raise ValueError(f'{name} must be a list of lots')
+    for lot in lots:
+        if not isinstance(lot, list) or len(lot) != 3:
+            raise ValueError(f'{name} lots must be lists of 3 values')
+        if lot[productIndex] not in PRODUCTS:
+            raise ValueError(f'{name} holds unknown product {lot[productIndex]}')
+        if not _isInt(lot[unitsIndex]) or lot[unitsIndex] < 0 or not _isInt(lot[expiresIndex]):
+            raise ValueError(f'{name} lots need integer units and expiry days')
+
+def validateScenario(record):
+    """ Turns a scenario record into the arguments of the simulation it asks for.
+        A record gives 'sim', 'TF' or 'QR', and the inputs of that simulation under the names main.py and QRSimulation
+        use: T, n, l, avgOrderInterval, maxOrderInterval, TargetInv, PI, CI and CLMatrix for TF, T, n, l, I, CLMatrix
+        and the policy vector 'policy' of 4 values per platoon for QR. Optional are 'seed', 'replications' (1),
+        'demandModel' (a registered DemandModels name) and for TF 'storage' (BloodProductStorage).
+        Returns :
+        (sim, inputs) with inputs a dictionary runScenario accepts
+        Raises :
+        ValueError naming the first invalid input """
+    sim = record.get('sim', 'TF')
+    if sim not in ('TF', 'QR'):
+        raise ValueError(f"sim must be 'TF' or 'QR', not {sim}")
+    T = _require(record, 'T', int)
+    n = _require(record, 'n', int)
+    if T < 1 or n < 1:
+        raise ValueError('T and n must be positive')
+    inputs = {'T': T, 'n': n}
+    for name in TF_PLATOON_INPUTS if sim == 'TF' else QR_PLATOON_INPUTS:
+        value = _require(record, name, list)
+        if len(value) != n:
+            raise ValueError(f'{name} has {len(value)} entries for {n} platoons')
+        inputs[name] = value
+    inputs['CLMatrix'] = [_combatLevels(entry, i) for i, entry in enumerate(inputs['CLMatrix'])]
+    if any(not _isInt(loc) or loc < 0 for loc in inputs['l']):
+        raise ValueError('l must hold non-negative integer locations')
+
+    if sim == 'TF':
+        if any(not _isInt(a) or not _isInt(m) or a < 1 or m < a
+               for a, m in zip(inputs['avgOrderInterval'], inputs['maxOrderInterval'])):
+            raise ValueError('order intervals must be integers with 1 <= avgOrderInterval <= maxOrderInterval')
+        if any(not isinstance(t, list) or len(t) != 2 or not all(_isInt(v) and v >= 0 for v in t) for t in inputs['TargetInv']):
+            raise ValueError('TargetInv entries must be [FWB target, Plasma target] of non-negative integers')
+        for i, lots in enumerate(inputs['PI']):
+            _lots(lots, f'PI entry {i}', 0, 1, 2)
+        inputs['CI'] = _require(record, 'CI', list)
+        _lots(inputs['CI'], 'CI', 0, 1, 2)
+        # the company fails the first order of a product it holds no usable units of
+        for k, product in enumerate(PRODUCTS):
+            if any(t[k] > 0 for t in inputs['TargetInv']) and not any(lot[0] == product and lot[1] > 0 and lot[2] > 0 for lot in inputs['CI']):
+                raise ValueError(f'CI holds no unexpired {product} units for the platoons to order')
+        inputs['storage'] = record.get('storage', STORAGES[0])
+        if inputs['storage'] not in STORAGES:
+            raise ValueError('storage must be one of ' + ', '.join(STORAGES))
+    else:
+        for i, lots in enumerate(inputs['I']):
+            _lots(lots, f'I entry {i}', 1, 2, 0)
+        policy = _require(record, 'policy', list)
+        if len(policy) != 4 * n or any(not _isInt(v) for v in policy):
+            raise ValueError(f'policy must hold 4 integers per platoon, {4 * n} in all')
+        inputs['policy'] = policy
+
+    inputs['replications'] = record.get('replications', 1)
+    if isinstance(inputs['replications'], bool) or not isinstance(inputs['replications'], int) or inputs['replications'] < 1:
+        raise ValueError('replications must be a positive integer')
+    inputs['seed'] = record.get('seed')
+    if inputs['seed'] is not None and (isinstance(inputs['seed'], bool) or not isinstance(inputs['seed'], int) or inputs['seed'] < 0):
+        raise ValueError('seed must be a non-negative integer')
+    inputs['demandModel'] = record.get('demandModel')
+    if inputs['demandModel'] is not None:
+        from DemandModels import getModel
+        try:
+            getModel(inputs['demandModel'])
+        except KeyError as e:
+            raise ValueError(e.args[0])
+    return sim, inputs
+
+def runScenario(sim, inputs):
+    """ Runs a validated scenario, replication j with the j-th seed spawned from its seed.
+        Returns :
+        dictionary of the result, for TF the company totals of every metric averaged over the replications, for QR the
+        mean and replication scores of QRSimulation.sim """
+    seeds = spawnSeeds(inputs['seed'], inputs['replications'])
+    if sim == 'TF':
+        from TransportFeedbackSim import TFSim
+        from BloodProductStorage import BloodProductStorage
+        from BucketProductStorage import BucketProductStorage
+        storage = BucketProductStorage if inputs['storage'] == 'BucketProductStorage' else BloodProductStorage
+        totals = np.zeros(len(METRICS))
+        for seed in seeds:
+            result = TFSim(inputs['T'], inputs['n'], inputs['l'], inputs['avgOrderInterval'], inputs['maxOrderInterval'],
+                           inputs['TargetInv'], inputs['PI'], inputs['CI'], inputs['CLMatrix'], storage, seed=seed,
+                           asResult=True, demandModel=inputs['demandModel'])
+            totals += result.data[:, inputs['n']].sum(axis=0)
+        return {'totals': dict(zip(METRICS, (totals / len(seeds)).tolist()))}
+
+    # sim reads its inputs from module globals, which are swapped for the scenario's during the run
+    import QRSimulation
+    saved = {name: getattr(QRSimulation, name) for name in ['T', 'n', 'l', 'I', 'CLMatrix']}
+    for name in saved:
+        setattr(QRSimulation, name, inputs[name])
+    try:
+        scores = [float(QRSimulation.sim(inputs['policy'], seed=seed, demandModel=inputs['demandModel'])) for seed in seeds]
+    finally:
+        for name, value in saved.items():
+            setattr(QRSimulation, name, value)
+    return {'score': float(np.mean(scores)), 'scores': scores}
+
+def _runRecord(id, sim, inputs):
+    """ Runs one scenario and returns its results record, failures are recorded instead of ending the sweep """
+    start = time.perf_counter()
+    try:
+        record = {'id': id, 'sim': sim, 'status': 'ok'}
+        record.update(runScenario(sim, inputs))
+    except Exception as e:
+        record = {'id': id, 'sim': sim, 'status': 'error', 'error': f'{type(e).__name__}: {e}'}
+    record['seconds'] = time.perf_counter() - start
+    return record
+
+def runBatch(scenarios, results, workers=None, inFlight=None, log=None):
+    """ Runs every scenario of a JSONL file and appends one results record per scenario to a JSONL file as it finishes.
+        Scenarios are read lazily and at most inFlight of them are submitted to the pool at any time, so memory stays
+        bounded however long the file. Invalid scenarios get a record with status 'invalid' without being run. Scenarios
+        the results file already holds an 'ok' record of are skipped, so an interrupted sweep resumes where it stopped;
+        every other scenario is validated and run again.
+        Args :
+        scenarios - path of the scenario JSONL file
+        results - path of the results JSONL file
+        workers - number of worker processes, None uses every core and 1 runs in this process
+        inFlight - most scenarios submitted at once, 2 per worker by default
+        log - file progress lines are written to, e.g. sys.stderr, nothing is written when None
+        Returns :
+        dictionary counting the scenarios that were 'ok', 'error', 'invalid' and 'skipped' """
+    counts = {'ok': 0, 'error': 0, 'invalid': 0, 'skipped': 0}
+    done = completedIds(results)
+    seen = set()
+    workers = workers or os.cpu_count()
+    inFlight = inFlight or 2 * workers
+
+    def jobs():
+        for id, record in readScenarios(scenarios):
+            if id in done or id in seen:
+                counts['skipped'] += 1
+                continue
+            seen.add(id)
+            try:
+                if record is None:
+                    raise ValueError('line is not a JSON object')
+                sim, inputs = validateScenario(record)
+            except Exception as e:
+                # validation failing in any other way still marks only this scenario invalid
+                write({'id': id, 'status': 'invalid', 'error': str(e) if isinstance(e, ValueError) else f'{type(e).__name__}: {e}'})
+                continue
+            yield id, sim, inputs
+
+    with open(results, 'a') as out:
+        def write(record):
+            out.write(json.dumps(record) + '\n')
+            out.flush()
+            counts[record['status']] += 1
+            if log is not None:
+                print(f"{record['id']}: {record['status']}" + (f" ({record['error']})" if 'error' in record else ''), file=log)
+
+        if workers == 1:
+            for job in jobs():
+                write(_runRecord(*job))
+            return counts
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = set()
+            for job in jobs():
+                if len(pending) >= inFlight:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        write(future.result())
+                pending.add(pool.submit(_runRecord, *job))
+            for future in wait(pending).done:
+                write(future.result())
+    return counts
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Runs the TF and QR scenarios of a JSONL file over a pool of worker processes')
+    parser.add_argument('scenarios', help='JSONL file with one scenario per line')
+    parser.add_argument('results', help='JSONL file one results record per scenario is appended to')
+    parser.add_argument('--workers', type=int, help='number of worker processes, every core by default')
+    parser.add_argument('--in-flight', type=int, help='most scenarios running or queued at once, 2 per worker by default')
+    parser.add_argument('--quiet', action='store_true', help='do not print a line per finished scenario')
+    args = parser.parse_args(argv)
+
+    counts = runBatch(args.scenarios, args.results, args.workers, args.in_flight, None if args.quiet else sys.stderr)
+    print(', '.join(f'{count} {status}' for status, count in counts.items()))
+    return 1 if counts['error'] + counts['invalid'] > 0 else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
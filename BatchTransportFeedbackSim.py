@@ -0,0 +1,201 @@
+import numpy as np
+import pandas as pd
+from TransportFeedbackSim import toDF
+from DemandModels import getModel, splitDemand
+from CombatSchedule import isStatic, samplePaths, sampleCombatLevels
+
+PRODUCTS = ['FWB', 'Plasma']
+METRICS = ['TransDays', 'TransSpace', 'FWBUnmet', 'PlasmaUnmet', 'FWBExpired', 'PlasmaExpired']
+
+
+def sampleTransfusionDemand(levels, rng, demandModel=None):
+    """ Vectorised counterpart of platoon.PlatoonDemand, drawing demand for many platoon-days in one call.
+        Args :
+        levels - integer array of combat levels of any shape
+        rng - numpy Generator used for the draws
+        demandModel - DemandModels model or registered name the demand is drawn from, the parametric model when None
+        Returns :
+        FWB and Plasma demand arrays, rounded to whole units, with the same shape as levels
+    """
+    numCasualities, TransfusionsDemand = getModel(demandModel).sample(levels, rng)
+    FWBDemand, plasmaDemand = splitDemand(TransfusionsDemand)
+    return np.rint(FWBDemand).astype(np.int64), np.rint(plasmaDemand).astype(np.int64)
+
+
+class _ProductState:
+  """ Array state of one blood product for all replications of a batched run.
+      Every lot in the scenario comes either from one of the company's initial lots or from a platoon's
+      initial inventory, and all lots age one day per day, so each lot source keeps a fixed expiry day.
+      Inventory is therefore held per lot source instead of per lot.
+      Attributes :
+      company - array (R, K) of units held by the company for each company lot, sorted by expiry
+      companyExp - array (K,) of the day each company lot expires
+      stock - array (R, n, S) of units on hand at each platoon, columns sorted per platoon by expiry
+      stockExp - array (n, S) of the day each platoon column expires
+      companyCols - array (n, K) of the platoon column that receives each company lot
+      pipeline - array (R, n, W, S) ring buffer of units in transit indexed by arrival day """
+  def __init__(self, R, n, W, companyLots, platoonLots):
+    # a lot that starts at or past its expiry is thrown away on day 1, as the storages of TFSim do
+    companyLots = [(qty, max(exp, 1)) for qty, exp in companyLots]
+    platoonLots = [[(qty, max(e, 1)) for qty, e in lots] for lots in platoonLots]
+    companyExp = sorted(set(exp for qty, exp in companyLots))
+    self.companyExp = np.array(companyExp, dtype=np.int64)
+    self.company = np.zeros((R, len(companyExp)), dtype=np.int64)
+    for qty, exp in companyLots:
+      self.company[:, companyExp.index(exp)] += qty
+
+    P = max([len(lots) for lots in platoonLots] + [0])
+    K = len(companyExp)
+    S = K + P
+    exp = np.zeros((n, S), dtype=np.int64)
+    initial = np.zeros((n, S), dtype=np.int64)
+    exp[:, :K] = self.companyExp
+    for i, lots in enumerate(platoonLots):
+      for j, (qty, e) in enumerate(lots):
+        exp[i, K + j] = e
+        initial[i, K + j] = qty
+    order = np.argsort(exp, axis=1, kind='stable')
+    self.stockExp = np.take_along_axis(exp, order, axis=1)
+    self.stock = np.repeat(np.take_along_axis(initial, order, axis=1)[None], R, axis=0)
+    self.companyCols = np.argsort(order, axis=1)[:, :K]
+    self.pipeline = np.zeros((R, n, W, S), dtype=np.int64)
+
+
+def BatchTFSim(R, T, n, l, avgOrderInterval, maxOrderInterval, TargetInv, PI, CI, CLMatrix, speed=None, capacity=None, seed=None, scenario=None, demandModel=None):
+    """ Runs R replications of the transport feedback simulation together, holding inventory, order countdowns and
+        combat levels as arrays with a leading replication axis.
+        Args :
+        R - number of replications
+        T, n, l, avgOrderInterval, maxOrderInterval, TargetInv, PI, CI, CLMatrix - same inputs as TFSim
+        speed - list of length n of transport speeds, defaults to 1 for every platoon
+        capacity - list of length n of transport capacities in pints, defaults to 10000 for every platoon
+        seed - seed or numpy Generator for the replications
+        scenario - DemandScenario whose first R replications are consumed instead of drawing random numbers, so that
+                   replication r matches TFSim run on the same scenario and replication
+        demandModel - DemandModels model or registered name the demand is drawn from without a scenario
+        CLMatrix entries may be CombatSchedule schedules, whose level paths are sampled for all days before the run
+        Returns :
+        integer array (R, n, 6, T), a view over day-major storage; result[r] has the layout TFSim passes to toDF
+        Differences from TFSim :
+        When an order does not fit on its transport, FWB is loaded first and Plasma fills the remaining capacity.
+        When the company runs out of stock, platoons receive what is left instead of the run failing.
+    """
+    rng = seed if isinstance(seed, np.random.Generator) else np.random.default_rng(seed)
+    speed = [1] * n if speed is None else speed
+    capacity = [10000] * n if capacity is None else capacity
+
+    lead = np.array([int(np.ceil(l[i] / speed[i])) for i in range(n)], dtype=np.int64)
+    cap = np.array(capacity, dtype=np.int64)
+    W = max(int(lead.max()), 1) + 1
+    slotLead = np.maximum(lead, 1) #a lead time of 0 puts the lot on hand before the next day's usage
+    platoonIdx = np.arange(n)
+    target = np.array(TargetInv, dtype=np.int64) # (n, 2)
+
+    products = []
+    for product in PRODUCTS:
+        companyLots = [(item[1], item[2]) for item in CI if item[0] == product]
+        platoonLots = [[(item[1], item[2]) for item in PI[i] if item[0] == product] for i in range(n)]
+        products.append(_ProductState(R, n, W, companyLots, platoonLots))
+
+    paths = None
+    if isStatic(CLMatrix):
+        width = max(len(cl) for cl in CLMatrix)
+        cumulativeCL = np.full((n, width), np.inf)
+        for i in range(n):
+            cumulativeCL[i, :len(CLMatrix[i])] = np.cumsum(CLMatrix[i])
+    elif scenario is None:
+        paths = samplePaths(CLMatrix, R, T, rng) #combat level paths of CombatSchedule entries, drawn for all days up front
+    avgI = np.array(avgOrderInterval, dtype=float)
+    maxI = np.array(maxOrderInterval, dtype=float)
+    minI = np.maximum(1, avgI - (maxI - avgI))
+
+    if scenario is None:
+        if paths is None:
+            sampleCombatLevels(cumulativeCL, (R, n), rng) #initial combat level, as drawn by Platoon.__init__
+        countDown = np.rint(rng.triangular(np.broadcast_to(minI, (R, n)), avgI, maxI)).astype(np.int64)
+    else:
+        countDown = np.array(scenario.orderIntervals[:R, 0], dtype=np.int64)
+
+    daily = np.zeros((T, 6, R, n), dtype=np.int64)
+    for day in range(1, T + 1):
+        t = day - 1
+        slot = day % W
+        for state in products:
+            state.company[:, state.companyExp == day] = 0
+
+        if scenario is None:
+            levels = sampleCombatLevels(cumulativeCL, (R, n), rng) if paths is None else paths[:, day]
+            demand = sampleTransfusionDemand(levels, rng, demandModel)
+        else:
+            FWBDemand, plasmaDemand = splitDemand(scenario.transfusionDemand[:R, day])
+            demand = (np.rint(FWBDemand).astype(np.int64), np.rint(plasmaDemand).astype(np.int64))
+
+        onHand = []
+        for p, state in enumerate(products):
+            state.stock += state.pipeline[:, :, slot, :]
+            state.pipeline[:, :, slot, :] = 0
+            expiring = state.stockExp == day
+            if expiring.any():
+                daily[t, 4 + p] = (state.stock * expiring).sum(axis=-1) + (state.pipeline * expiring[:, None, :]).sum(axis=(-2, -1))
+                state.stock[:, expiring] = 0
+                state.pipeline *= ~expiring[:, None, :]
+
+            cum = np.cumsum(state.stock, axis=-1)
+            need = demand[p][..., None]
+            state.stock = np.minimum(state.stock, np.maximum(cum - need, 0))
+            daily[t, 2 + p] = np.maximum(demand[p] - cum[..., -1], 0)
+            onHand.append(state.stock.sum(axis=-1))
+
+        countDown -= 1
+        fired = countDown == 0
+        if not fired.any():
+            continue
+        rows, cols = np.nonzero(fired)
+        if scenario is None:
+            countDown[rows, cols] = np.rint(rng.triangular(minI[cols], avgI[cols], maxI[cols])).astype(np.int64)
+        else:
+            countDown[rows, cols] = scenario.orderIntervals[:R, day][rows, cols]
+
+        request = [np.where(fired, np.maximum(target[:, p] - onHand[p], 0), 0) for p in range(2)]
+        total = request[0] + request[1]
+        fits = total <= cap
+        shipFWB = np.where(fits, request[0], np.minimum(request[0], cap))
+        shipPlasma = np.where(fits, request[1], np.minimum(request[1], cap - shipFWB))
+        daily[t, 0] = np.where(fired, lead, 0)
+        daily[t, 1] = np.where(fits, total, cap)
+
+        for state, ship in zip(products, [shipFWB, shipPlasma]):
+            if state.company.shape[1] == 0:
+                continue
+            # platoons draw from the company in index order, each taking the next slice of FEFO-ordered stock
+            shipEnd = np.cumsum(ship, axis=1)[:, :, None]
+            stockEnd = np.cumsum(state.company, axis=1)[:, None, :]
+            got = np.minimum(shipEnd, stockEnd) - np.maximum(shipEnd - ship[:, :, None], stockEnd - state.company[:, None, :])
+            got = np.maximum(got, 0)
+            state.company -= got.sum(axis=1)
+            delivered = np.zeros_like(state.stock)
+            delivered[:, platoonIdx[:, None], state.companyCols] = got
+            state.pipeline[:, platoonIdx, (day + slotLead) % W, :] += delivered
+
+    return daily.transpose(2, 3, 1, 0)
+
+
+def batchToDF(result):
+    """ Builds one DataFrame for a batched run with the columns toDF produces.
+        Args :
+        result - array (R, n, 6, T) returned by BatchTFSim
+        Returns :
+        DataFrame indexed by (Replication, Day)
+    """
+    R, n, m, T = result.shape
+    platoonCols = ['Platoon' + str(i + 1) + '_' + metric for i in range(n) for metric in METRICS]
+    companyCols = ['Company_' + metric for metric in METRICS]
+    perDay = result.transpose(0, 3, 1, 2) # (R, T, n, 6)
+    data = np.concatenate([perDay.reshape(R * T, n * m), perDay.sum(axis=2).reshape(R * T, m)], axis=1)
+    index = pd.MultiIndex.from_product([range(R), range(T)], names=['Replication', 'Day'])
+    return pd.DataFrame(data, index=index, columns=platoonCols + companyCols)
+
+
+def replicationDF(result, r):
+    """ Returns the toDF DataFrame of replication r of a batched run """
+    return toDF(result[r])
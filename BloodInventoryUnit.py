@@ -1,4 +1,6 @@
 class BloodInventoryUnit:
+  __slots__ = ('ageUsable', 'productType', 'quantity')
+
   def __init__(self, exp, prod, quant):
     self.ageUsable = exp #Days until the inventory expires
     self.productType = prod #The type of blood product
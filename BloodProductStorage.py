@@ -1,57 +1,174 @@
+import math
+from bisect import bisect_left
+
+class TransitPipeline:
+  """ Lots that have been shipped to a storage but have not arrived yet, indexed by arrival day
+      Attributes :
+      arrivals - dictionary from absolute arrival day to the list of [# of units, expiry day] lots arriving that day
+      total - running total of units in transit
+      nextExpiry - lower bound on the earliest expiry day of any lot in transit """
+  def __init__(self):
+    self.arrivals = {}
+    self.total = 0
+    self.nextExpiry = math.inf
+
+  def add(self, NumUnits, exp, arrival):
+    self.arrivals.setdefault(arrival, []).append([NumUnits, exp])
+    self.total += NumUnits
+    self.nextExpiry = min(self.nextExpiry, exp)
+
+  def arrive(self, day):
+    """ Removes and returns the lots arriving on the given day in the order they were shipped """
+    lots = self.arrivals.pop(day, [])
+    for lot in lots:
+      self.total -= lot[0]
+    return lots
+
+  def expire(self, day):
+    """ Drops lots that expire in transit by the given day and returns the number of units dropped """
+    if self.nextExpiry > day:
+      return 0
+    exp = 0
+    self.nextExpiry = math.inf
+    for arrival in list(self.arrivals):
+      kept = []
+      for lot in self.arrivals[arrival]:
+        if lot[1] <= day:
+          exp += lot[0]
+        else:
+          kept.append(lot)
+          self.nextExpiry = min(self.nextExpiry, lot[1])
+      if len(kept) > 0:
+        self.arrivals[arrival] = kept
+      else:
+        del self.arrivals[arrival]
+    self.total -= exp
+    return exp
+
+  def nextArrival(self):
+    """ Returns the earliest arrival day of any lot in transit, infinity when nothing is in transit """
+    return min(self.arrivals) if len(self.arrivals) > 0 else math.inf
+
+  def arriveBy(self, day):
+    """ Removes and returns the lots arriving by the given day in order of arrival """
+    lots = []
+    for arrival in sorted(a for a in self.arrivals if a <= day):
+      lots += self.arrive(arrival)
+    return lots
+
+  def lots(self, day):
+    """ Lots in transit as (# of units, days until experation, days until arrival) tuples """
+    return [(lot[0], lot[1] - day, arrival - day) for arrival in sorted(self.arrivals) for lot in self.arrivals[arrival]]
+
+
 class BloodProductStorage:
+  """ Class representing the stock of one blood product held by a company or platoon.
+      On-hand lots are kept apart from lots still in transit, and days are stored as absolute simulation days so that
+      a day passing does not rewrite every lot.
+      Attributes :
+      day - number of timesteps taken by the storage
+      onHand - list of [# of units, expiry day] lots on hand in reverse FEFO order, the next lot to issue is last
+      onHandTotal - running total of units on hand
+      pipeline - TransitPipeline of lots that have not arrived """
 
   # inventory is a list of tuples containing (# of units, days until experation, days until arrival)
   def __init__(self, inventory):
-    self.inventory = inventory
+    self.day = 0
+    self.onHand = []
+    self.onHandTotal = 0
+    self.pipeline = TransitPipeline()
+    for item in inventory:
+      self.add(item[0], item[1], item[2])
 
   def add(self, NumUnits, Exp, Arrival):
-    item = (NumUnits, Exp, Arrival)
-    for i in range(len(self.inventory)):
-      if item[1] < self.inventory[i][1]:
-        self.inventory.insert(i, item)
-        return
-      elif item[1] == self.inventory[i][1] and item[2] < self.inventory[i][2]:
-        self.inventory.insert(i, item)
-        return
-    self.inventory.append(item)
+    if Arrival > 0:
+      self.pipeline.add(NumUnits, self.day + Exp, self.day + Arrival)
+    else:
+      self.stock([NumUnits, self.day + Exp])
+
+  def stock(self, lot):
+    """ Puts a [# of units, expiry day] lot on hand behind any lots with the same expiry """
+    self.onHand.insert(bisect_left(self.onHand, -lot[1], key=lambda l: -l[1]), lot)
+    self.onHandTotal += lot[0]
 
   def use(self, NumUnits):
-    skips = 0
-    while NumUnits > 0 and len(self.inventory) > skips:
-      if self.inventory[skips][2] > 0:
-        skips += 1
-      elif self.inventory[skips][0] > NumUnits:
-        self.inventory[skips] = [self.inventory[skips][0] - NumUnits, self.inventory[skips][1], self.inventory[skips][2]]
+    while NumUnits > 0 and len(self.onHand) > 0:
+      lot = self.onHand[-1]
+      if lot[0] > NumUnits:
+        lot[0] -= NumUnits
+        self.onHandTotal -= NumUnits
         NumUnits = 0
       else:
-        NumUnits -= self.inventory[skips][0]
-        self.inventory.pop(skips)
+        NumUnits -= lot[0]
+        self.onHandTotal -= lot[0]
+        self.onHand.pop()
     return NumUnits
 
   def avail(self):
-    return sum(i[0] for i in self.inventory if i[2] == 0)
+    return self.onHandTotal
+
+  def inTransit(self):
+    return self.pipeline.total
+
+  def position(self):
+    """ Inventory position, units on hand plus units in transit """
+    return self.onHandTotal + self.pipeline.total
 
   def export(self, need):
+    # only stock on hand can be exported, an IndexError is raised when it runs out
     found = []
     while need > 0:
-      if self.inventory[0][0] > need:
-        found.append((need, self.inventory[0][1], self.inventory[0][2]))
-        self.inventory[0] = (self.inventory[0][0] - need, self.inventory[0][1], self.inventory[0][2])
+      lot = self.onHand[-1]
+      if lot[0] > need:
+        found.append((need, lot[1] - self.day, 0))
+        lot[0] -= need
+        self.onHandTotal -= need
         need = 0
       else:
-        need -= self.inventory[0][0]
-        found.append(self.inventory[0])
-        self.inventory.pop(0)
+        need -= lot[0]
+        found.append((lot[0], lot[1] - self.day, 0))
+        self.onHandTotal -= lot[0]
+        self.onHand.pop()
     return found
 
   def timestep(self):
-    self.inventory = [(i[0], i[1] - 1, max(i[2] - 1, 0)) for i in self.inventory]
-    exp = 0
-    while len(self.inventory) > 0 and self.inventory[0][1] <= 0:
-      exp += self.inventory[0][0]
-      self.inventory.pop(0)
+    self.day += 1
+    for lot in self.pipeline.arrive(self.day):
+      self.stock(lot)
+    exp = self.pipeline.expire(self.day)
+    while len(self.onHand) > 0 and self.onHand[-1][1] <= self.day:
+      exp += self.onHand[-1][0]
+      self.onHandTotal -= self.onHand[-1][0]
+      self.onHand.pop()
+    return exp
+
+  def advance(self, day):
+    """ Moves the storage forward to an absolute day at once, ending in the state the same number of timesteps
+        would leave it in, and returns the number of units expired on the way """
+    for lot in self.pipeline.arriveBy(day):
+      self.stock(lot)
+    self.day = day
+    exp = self.pipeline.expire(day)
+    while len(self.onHand) > 0 and self.onHand[-1][1] <= day:
+      exp += self.onHand[-1][0]
+      self.onHandTotal -= self.onHand[-1][0]
+      self.onHand.pop()
     return exp
 
+  def nextExpiry(self):
+    """ Returns a lower bound on the next absolute day any lot expires, infinity when the storage is empty """
+    return min(self.onHand[-1][1] if len(self.onHand) > 0 else math.inf, self.pipeline.nextExpiry)
+
+  def nextArrival(self):
+    """ Returns the next absolute day a lot in transit arrives, infinity when nothing is in transit """
+    return self.pipeline.nextArrival()
+
+  @property
+  def inventory(self):
+    """ All lots as (# of units, days until experation, days until arrival) tuples sorted by expiry, then arrival """
+    onHand = [(lot[0], lot[1] - self.day, 0) for lot in reversed(self.onHand)]
+    return sorted(onHand + self.pipeline.lots(self.day), key=lambda item: (item[1], item[2]))
+
   def __str__(self):
     return 'Inventory: ' + str(self.inventory)
 
@@ -102,4 +219,4 @@ def run_tests():
 
 # Run the tests
 run_tests()
-'''
\ No newline at end of file
+'''
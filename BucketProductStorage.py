@@ -0,0 +1,152 @@
+from BloodProductStorage import TransitPipeline
+
+class BucketProductStorage:
+  """ Drop-in replacement for BloodProductStorage that keeps on-hand lots in a ring of buckets indexed by expiry day.
+      Days are kept as absolute simulation days, so a day passing only moves the current day forward instead of
+      rewriting every lot, and expiry empties the buckets that fall due.
+      Attributes :
+      day - number of timesteps taken by the storage
+      buckets - ring of lists, bucket e % size holds the [# of units, expiry day] lots on hand expiring on absolute day e
+      head - earliest absolute expiry day whose bucket has not been emptied
+      last - latest absolute expiry day that may hold lots
+      onHandTotal - running total of units on hand
+      pipeline - TransitPipeline of lots that have not arrived """
+
+  # inventory is a list of tuples containing (# of units, days until experation, days until arrival)
+  def __init__(self, inventory, maxExpiry=300):
+    self.day = 0
+    self.size = maxExpiry + 2
+    self.buckets = [[] for i in range(self.size)]
+    self.head = 0
+    self.last = 0
+    self.onHandTotal = 0
+    self.pipeline = TransitPipeline()
+    for item in inventory:
+      self.add(item[0], item[1], item[2])
+
+  def add(self, NumUnits, Exp, Arrival):
+    exp = self.day + max(Exp, 0) #lots already at or past expiry are dropped on the next timestep either way
+    if Arrival > 0:
+      self.pipeline.add(NumUnits, exp, self.day + Arrival)
+    else:
+      self.stock([NumUnits, exp])
+
+  def stock(self, lot):
+    """ Puts a [# of units, expiry day] lot on hand behind any lots with the same expiry """
+    head = min(self.head, lot[1])
+    if max(self.last, lot[1]) - head >= self.size:
+      self._grow(max(self.last, lot[1]) - head + 1)
+    self.head = head
+    self.last = max(self.last, lot[1])
+    self.buckets[lot[1] % self.size].append(lot)
+    self.onHandTotal += lot[0]
+
+  def use(self, NumUnits):
+    start = NumUnits
+    for exp in range(self.head, self.last + 1):
+      bucket = self.buckets[exp % self.size]
+      while len(bucket) > 0 and NumUnits > 0:
+        if bucket[0][0] > NumUnits:
+          bucket[0][0] -= NumUnits
+          NumUnits = 0
+        else:
+          NumUnits -= bucket[0][0]
+          bucket.pop(0)
+      if NumUnits == 0:
+        break
+    self.onHandTotal -= start - NumUnits
+    return NumUnits
+
+  def avail(self):
+    return self.onHandTotal
+
+  def inTransit(self):
+    return self.pipeline.total
+
+  def position(self):
+    """ Inventory position, units on hand plus units in transit """
+    return self.onHandTotal + self.pipeline.total
+
+  def export(self, need):
+    # only stock on hand can be exported, an IndexError is raised when it runs out
+    found = []
+    exp = self.head
+    while need > 0:
+      if exp > self.last:
+        raise IndexError('not enough units in storage to export')
+      bucket = self.buckets[exp % self.size]
+      if len(bucket) == 0:
+        exp += 1
+      elif bucket[0][0] > need:
+        found.append((need, exp - self.day, 0))
+        bucket[0][0] -= need
+        self.onHandTotal -= need
+        need = 0
+      else:
+        need -= bucket[0][0]
+        found.append((bucket[0][0], exp - self.day, 0))
+        self.onHandTotal -= bucket[0][0]
+        bucket.pop(0)
+    return found
+
+  def timestep(self):
+    self.day += 1
+    for lot in self.pipeline.arrive(self.day):
+      self.stock(lot)
+    exp = self.pipeline.expire(self.day)
+    while self.head <= self.day:
+      bucket = self.buckets[self.head % self.size]
+      for lot in bucket:
+        exp += lot[0]
+        self.onHandTotal -= lot[0]
+      bucket.clear()
+      self.head += 1
+    return exp
+
+  def advance(self, day):
+    """ Moves the storage forward to an absolute day at once, ending in the state the same number of timesteps
+        would leave it in, and returns the number of units expired on the way """
+    for lot in self.pipeline.arriveBy(day):
+      self.stock(lot)
+    self.day = day
+    exp = self.pipeline.expire(day)
+    while self.head <= min(day, self.last):
+      bucket = self.buckets[self.head % self.size]
+      for lot in bucket:
+        exp += lot[0]
+        self.onHandTotal -= lot[0]
+      bucket.clear()
+      self.head += 1
+    self.head = max(self.head, day + 1)
+    return exp
+
+  def nextExpiry(self):
+    """ Returns a lower bound on the next absolute day any lot expires, infinity when the storage is empty.
+        Empty buckets passed on the way are skipped for good by moving head, so repeated calls stay cheap """
+    exp = self.pipeline.nextExpiry
+    while self.head <= min(self.last, exp - 1):
+      if len(self.buckets[self.head % self.size]) > 0:
+        return self.head
+      self.head += 1
+    return exp
+
+  def nextArrival(self):
+    """ Returns the next absolute day a lot in transit arrives, infinity when nothing is in transit """
+    return self.pipeline.nextArrival()
+
+  def _grow(self, size):
+    """ Rebuilds the ring with room for at least size consecutive expiry days """
+    lots = [(exp, self.buckets[exp % self.size]) for exp in range(self.head, self.last + 1)]
+    self.size = max(size, 2 * self.size)
+    self.buckets = [[] for i in range(self.size)]
+    for exp, bucket in lots:
+      self.buckets[exp % self.size] = bucket
+
+  @property
+  def inventory(self):
+    """ All lots as (# of units, days until experation, days until arrival) tuples sorted by expiry, then arrival """
+    onHand = [(lot[0], exp - self.day, 0) for exp in range(self.head, self.last + 1) for lot in self.buckets[exp % self.size]]
+    return sorted(onHand + self.pipeline.lots(self.day), key=lambda item: (item[1], item[2]))
+
+  def __str__(self):
+    return 'Inventory: ' + str(self.inventory)
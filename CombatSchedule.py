@@ -0,0 +1,231 @@
+import re
+from bisect import bisect_left, bisect_right
+import numpy as np
+
+class StaticSchedule:
+  """ Combat levels drawn independently every day from one distribution, the model a plain combatLevelList stands for.
+      Attributes :
+      cl - list of the probability of each combat level """
+  def __init__(self, cl):
+    self.cl = list(cl)
+    self._cumulative = np.cumsum(self.cl).tolist()
+
+  def levels(self):
+    return len(self.cl)
+
+  def distributions(self, T):
+    """ Returns array (T + 1, levels) of the level distribution of every day """
+    return np.tile(np.asarray(self.cl, dtype=float), (T + 1, 1))
+
+  def draw(self, day, previous, rng):
+    """ Draws the level of one day with one uniform, as Platoon.updateCombatLevel does """
+    return bisect_left(self._cumulative, rng.random())
+
+
+class PiecewiseSchedule:
+  """ Combat levels drawn independently every day from a distribution that changes over the campaign.
+      Days before the first range use the first distribution and days after the last range the last one, the draw
+      made when a platoon is created counts as day 0.
+      Attributes :
+      starts - sorted list of the first day of each range
+      ends - list of the last day of each range
+      cls - list of the level distribution of each range """
+  def __init__(self, ranges):
+    #ranges - list of (first day, last day, level distribution) tuples that do not overlap
+    ranges = sorted(ranges, key=lambda r: r[0])
+    for (s1, e1, cl1), (s2, e2, cl2) in zip(ranges, ranges[1:]):
+      if s2 <= e1:
+        raise ValueError(f'day ranges {s1}-{e1} and {s2}-{e2} overlap')
+    self.starts = [int(r[0]) for r in ranges]
+    self.ends = [int(r[1]) for r in ranges]
+    self.cls = [list(r[2]) for r in ranges]
+    self._cumulative = [np.cumsum(cl).tolist() for cl in self.cls]
+
+  def levels(self):
+    return max(len(cl) for cl in self.cls)
+
+  def rangeOf(self, day):
+    """ Returns the index of the range whose distribution applies on day, a gap between ranges keeps the earlier one """
+    return max(0, bisect_right(self.starts, day) - 1)
+
+  def distributions(self, T):
+    table = np.zeros((T + 1, self.levels()))
+    days = np.arange(T + 1)
+    index = np.maximum(np.searchsorted(self.starts, days, side='right') - 1, 0)
+    for k, cl in enumerate(self.cls):
+      table[index == k, :len(cl)] = cl
+    return table
+
+  def draw(self, day, previous, rng):
+    return bisect_left(self._cumulative[self.rangeOf(day)], rng.random())
+
+
+class MarkovSchedule:
+  """ Combat levels following a Markov chain, so fighting persists from day to day.
+      Attributes :
+      starts - sorted list of the first day each transition matrix applies from, the first is always 0
+      transitions - list of arrays (levels, levels), row a the distribution of tomorrow's level after a day at level a
+      initial - distribution of the level drawn when a platoon is created """
+  def __init__(self, transitions, initial=None):
+    #transitions - array (levels, levels) of transition probabilities, or a list of (first day, matrix) pairs for
+    #              transitions that change over the campaign
+    #initial - initial level distribution, the stationary distribution of the first matrix when None
+    if isinstance(transitions, np.ndarray) or not isinstance(transitions[0], tuple):
+      transitions = [(0, transitions)]
+    transitions = sorted(transitions, key=lambda t: t[0])
+    self.starts = [0] + [int(t[0]) for t in transitions[1:]]
+    self.transitions = [np.asarray(t[1], dtype=float) for t in transitions]
+    for matrix in self.transitions:
+      if matrix.shape != self.transitions[0].shape or not np.allclose(matrix.sum(axis=1), 1):
+        raise ValueError('transition matrices must be square, of one size and have rows summing to 1')
+    self.initial = stationary(self.transitions[0]) if initial is None else np.asarray(initial, dtype=float)
+    self._cumulative = [np.cumsum(m, axis=1).tolist() for m in self.transitions]
+    self._initial = np.cumsum(self.initial).tolist()
+
+  @classmethod
+  def fromPersistence(cls, cl, persistence):
+    """ Builds a chain with the stationary distribution cl in which a day repeats the level before it with probability
+        persistence and otherwise draws afresh from cl, the i.i.d. model for persistence 0 """
+    cl = np.asarray(cl, dtype=float)
+    matrix = persistence * np.eye(len(cl)) + (1 - persistence) * cl[None, :]
+    return cls(matrix, cl)
+
+  def levels(self):
+    return len(self.initial)
+
+  def matrixOf(self, day):
+    return max(0, bisect_right(self.starts, day) - 1)
+
+  def draw(self, day, previous, rng):
+    if previous is None:
+      return bisect_left(self._initial, rng.random())
+    return bisect_left(self._cumulative[self.matrixOf(day)][int(previous)], rng.random())
+
+
+def stationary(matrix):
+  """ Returns the stationary distribution of a transition matrix """
+  values, vectors = np.linalg.eig(np.asarray(matrix, dtype=float).T)
+  pi = np.real(vectors[:, np.argmin(np.abs(values - 1))])
+  return pi / pi.sum()
+
+def asSchedule(cl):
+  """ Returns the schedule a CLMatrix entry stands for, a plain list of probabilities being a StaticSchedule """
+  return cl if hasattr(cl, 'draw') else StaticSchedule(cl)
+
+def isStatic(CLMatrix):
+  """ Whether every entry of CLMatrix is a plain list of level probabilities """
+  return not any(hasattr(cl, 'draw') for cl in CLMatrix)
+
+
+class CompiledSchedules:
+  """ The schedules of every platoon turned into per-day lookup tables for T days, built once per scenario.
+      Attributes :
+      T - number of days
+      cumulative - array (T + 1, n, levels) of the cumulative level distribution of every day and platoon, padded with
+                   infinity; for Markov platoons the initial distribution sits on day 0
+      markov - array of the indices of the platoons following Markov chains
+      matrices - array (matrices, levels, levels) of the distinct cumulative transition matrices, each stored once
+      matrixIndex - array (T + 1, len(markov)) of the matrix in effect every day for each Markov platoon """
+  def __init__(self, CLMatrix, T):
+    schedules = [asSchedule(cl) for cl in CLMatrix]
+    n = len(schedules)
+    width = max(s.levels() for s in schedules)
+    self.T = T
+    self.cumulative = np.full((T + 1, n, width), np.inf)
+    self.markov = np.array([i for i, s in enumerate(schedules) if isinstance(s, MarkovSchedule)], dtype=np.int64)
+    for i, s in enumerate(schedules):
+      if isinstance(s, MarkovSchedule):
+        self.cumulative[0, i, :s.levels()] = np.cumsum(s.initial)
+      else:
+        table = s.distributions(T)
+        self.cumulative[:, i, :table.shape[1]] = np.cumsum(table, axis=1)
+    matrices = []
+    first = {} #index in matrices of the first matrix of each schedule, platoons sharing a schedule share its matrices
+    self.matrixIndex = np.zeros((T + 1, len(self.markov)), dtype=np.int64)
+    for k, i in enumerate(self.markov):
+      s = schedules[i]
+      if id(s) not in first:
+        first[id(s)] = len(matrices)
+        for matrix in s.transitions:
+          table = np.full((width, width), np.inf)
+          table[:s.levels(), :s.levels()] = np.cumsum(matrix, axis=1)
+          # the last level of every row catches rounding, as searching a cumulative sum does
+          table[:s.levels(), s.levels() - 1] = np.maximum(table[:s.levels(), s.levels() - 1], 1)
+          matrices.append(table)
+      self.matrixIndex[:, k] = first[id(s)] + np.maximum(np.searchsorted(s.starts, np.arange(T + 1), side='right') - 1, 0)
+    self.matrices = np.array(matrices).reshape(len(matrices), width, width)
+
+  def sample(self, R, rng):
+    """ Samples the combat levels of R replications of every day and platoon.
+        Independent days are drawn with one comparison over the whole (R, T + 1, n) block, Markov platoons day by day
+        for all replications at once. One uniform is used per platoon-day, the same uniforms sampleCombatLevels uses,
+        so schedules standing for plain lists reproduce its draws.
+        Returns :
+        integer array (R, T + 1, n) of combat levels """
+    p = rng.random((R, self.T + 1, self.cumulative.shape[1]))
+    levels = (self.cumulative[None] < p[..., None]).sum(axis=-1)
+    if len(self.markov) > 0:
+      for t in range(1, self.T + 1):
+        rows = self.matrices[self.matrixIndex[t][None, :], levels[:, t - 1, self.markov]]
+        levels[:, t, self.markov] = (rows < p[:, t, self.markov, None]).sum(axis=-1)
+    return levels
+
+
+def sampleCombatLevels(cumulativeCL, shape, rng):
+  """ Samples combat levels for every platoon the same way Platoon.updateCombatLevel does.
+      Args :
+      cumulativeCL - array (n, levels) of cumulative combat level probabilities for each platoon
+      shape - leading shape of the draw, the last axis must be the platoon axis
+      Returns :
+      integer array of combat levels with the given shape """
+  p = rng.random(shape)
+  return (cumulativeCL < p[..., None]).sum(axis=-1)
+
+def samplePaths(CLMatrix, R, T, rng):
+  """ Samples (R, T + 1, n) combat level paths for a CLMatrix whose entries are level probability lists or schedules """
+  return CompiledSchedules(CLMatrix, T).sample(R, rng)
+
+def fromRanges(ranges):
+  """ Builds a PiecewiseSchedule from the ranges the Streamlit Conflict Prediction page stores.
+      Args :
+      ranges - list of {'Days': 'first-last', 'Dist': weights} entries as in its saved user data, or of
+               ((first, last), weights) pairs; slider weights of level k are normalised into probabilities of level k
+      Returns :
+      PiecewiseSchedule """
+  parsed = []
+  for entry in ranges:
+    if isinstance(entry, dict):
+      first, last = (int(x) for x in str(entry['Days']).split('-'))
+      weights = entry['Dist']
+    else:
+      (first, last), weights = entry
+    total = float(sum(weights))
+    if total <= 0:
+      raise ValueError(f'day range {first}-{last} has no weight on any level')
+    parsed.append((first, last, [w / total for w in weights]))
+  return PiecewiseSchedule(parsed)
+
+def fromWeeklyKeys(data, weekLength=7):
+  """ Builds a PiecewiseSchedule from the week_<w>_level_<k> slider weights in saved_data.json, week w covering days
+      w * weekLength + 1 to (w + 1) * weekLength
+      Args :
+      data - dictionary of the saved data
+      weekLength - days per week
+      Returns :
+      PiecewiseSchedule, None when the data holds no weekly keys """
+  weeks = {}
+  for key, value in data.items():
+    match = re.fullmatch(r'week_(\d+)_level_(\d+)', key)
+    if match is not None:
+      weeks.setdefault(int(match.group(1)), {})[int(match.group(2))] = value
+  if len(weeks) == 0:
+    return None
+  levels = max(k for week in weeks.values() for k in week) + 1
+  rows = [[weeks[w].get(k, 0) for k in range(levels)] for w in sorted(weeks)]
+  return fromWeeklyData(rows, weekLength, sorted(weeks))
+
+def fromWeeklyData(rows, weekLength=7, weeks=None):
+  """ Builds a PiecewiseSchedule from rows of slider weights per week, such as the 'Data' of a saved
+      'Weekly Conflict Level Distribution' """
+  weeks = range(len(rows)) if weeks is None else weeks
+  return fromRanges([((w * weekLength + 1, (w + 1) * weekLength), row) for w, row in zip(weeks, rows)])
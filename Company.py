@@ -1,4 +1,5 @@
 import math
+import numpy as np
 from transport import Transport
 from BloodInventoryUnit import BloodInventoryUnit
 from BloodProductStorage import BloodProductStorage
@@ -11,78 +12,115 @@ class Company:
   Plasmainentory - BloodProductStorage object representing current Plasma inventory of the company
   transportCapabilities - list of Transport objects representing transport capabilities availiable to company
   platoonList - list of platoons that is serviced by the company
+  fleet - FleetDispatcher sharing its transports between all platoons, None ships platoon i's orders with transport i
    """
-  def __init__(self, FWBinventory: BloodProductStorage, Plasmainventory: BloodProductStorage, transport, platoons):
+  def __init__(self, FWBinventory: BloodProductStorage, Plasmainventory: BloodProductStorage, transport, platoons, fleet=None):
     self.FWBinventory = FWBinventory
     self.Plasmainventory = Plasmainventory
     self.transportCapabilities = transport #List of Transport objects that provide the transport available to the company for BloodInventoryUnit delivery
     self.platoonList = platoons #List of medical platoons that the company services
+    self.fleet = fleet
 
 
-  def timeStep(self):
+  def timeStep(self, out=None):
     """function that represents passing of 1 day in the simulation
-      Returns : list with entries for that time step of
+      Args :
+      out - optional writable array (platoons, 6), e.g. from SimulationResult.nextRow, that row i of is filled with
+            platoon i's [Transport Days, Transport Space, FWB unmet, Plasma unmet, Expired FWB, Expired Plasma] instead of building lists
+      Returns : out when given, otherwise list with entries for that time step of
       [[Transport Days Used by  platoon], [Transport Space Used by platoon], [FWB unmet demand by platoon], [Plasma unmet demand by platoon], [Expired FWB by platoon], [Expired Plasma by platoon]] """
     
     self.FWBinventory.timestep()
     self.Plasmainventory.timestep()
 
-    FWBUnmet = []
-    PlasmaUnmet = []
-    ExpiredFWB = []
-    ExpiredPlasma = []
-    transportDays = []
-    transportSpace = []
+    orders = []
+    rows = np.zeros((len(self.platoonList), 6), dtype=np.int64) if out is None else out
     for i in range(len(self.platoonList)):
       demand, FWBU, PlasmaU, FWBE, PlasmaE = self.platoonList[i].timeStep()
-      FWBUnmet.append(FWBU)
-      PlasmaUnmet.append(PlasmaU)
-      ExpiredFWB.append(FWBE)
-      ExpiredPlasma.append(PlasmaE)
-      tDays, tSpace = self.orderPlanning(demand, i)
-      transportDays.append(tDays)
-      transportSpace.append(tSpace)
-      
-    return [transportDays, transportSpace, FWBUnmet, PlasmaUnmet, ExpiredFWB, ExpiredPlasma]
+      tDays, tSpace = self.plan(demand, i, orders)
+      rows[i] = (tDays, tSpace, FWBU, PlasmaU, FWBE, PlasmaE)
+    if self.fleet is not None:
+      for i, used in self.dispatchOrders(orders).items():
+        rows[i, :2] = used
+    if out is None:
+      return rows.T.tolist()
+    return out
+
+  def plan(self, demand, platoonIndex, orders):
+    """ Ships an order with the platoon's own transport, or with a shared fleet collects it in orders to be dispatched
+        together with the rest of the day's orders
+        Returns :
+        days of transport used and units of transport space used, 0 for orders left to the fleet """
+    if self.fleet is None:
+      return self.orderPlanning(demand, platoonIndex)
+    if demand is not None:
+      orders.append((platoonIndex, demand))
+    return 0, 0
+
+  def dispatchOrders(self, orders):
+    """ Dispatches the day's orders with the shared fleet
+        Args :
+        orders - list of (platoon index, order) placed today
+        Returns :
+        dictionary from platoon index to the (days, space) of transport used by the orders shipped to it today """
+    used = {}
+    for transport, stops in self.fleet.dispatch(orders):
+      for platoonIndex, demand, lead, reported in stops:
+        tDays, tSpace = self.ship(demand, platoonIndex, transport, lead)
+        days, space = used.get(platoonIndex, (0, 0))
+        used[platoonIndex] = (days + reported, space + tSpace)
+    return used
 
   def orderPlanning(self, demand, platoonIndex):
     if demand == None:
       return 0, 0
-    FWBonHand, PlasmaOnHand = self.findInventory(demand[0], demand[1])
     transport = self.transportCapabilities[platoonIndex]
+    return self.ship(demand, platoonIndex, transport, math.ceil(self.platoonList[platoonIndex].location / transport.speed))
+
+  def ship(self, demand, platoonIndex, transport, lead):
+    """ Method that loads an order onto a transport and sends it to a platoon
+        Args :
+        demand - order as [FWB units, Plasma units]
+        platoonIndex - index of the platoon ordering
+        transport - Transport carrying the order
+        lead - days until the order arrives
+        Returns :
+        days of transport used and units of transport space used """
+    FWBonHand, PlasmaOnHand = self.findInventory(demand[0], demand[1])
+    platoon = self.platoonList[platoonIndex]
     cap = transport.capacity
     if cap >= demand[0] + demand[1]:
       for j in FWBonHand:
-        self.platoonList[platoonIndex].addInventory('FWB', j[0], j[1], math.ceil(self.platoonList[platoonIndex].location / self.transportCapabilities[platoonIndex].speed))
+        platoon.addInventory('FWB', j[0], j[1], lead)
       for j in PlasmaOnHand:
-        self.platoonList[platoonIndex].addInventory('Plasma', j[0], j[1], math.ceil(self.platoonList[platoonIndex].location / self.transportCapabilities[platoonIndex].speed))
-      return math.ceil(self.platoonList[platoonIndex].location / self.transportCapabilities[platoonIndex].speed), demand[0] + demand[1]
+        platoon.addInventory('Plasma', j[0], j[1], lead)
+      return lead, demand[0] + demand[1]
     while cap > 0:
       if demand[0] > 0:
         if FWBonHand[0][0] < cap:
-          self.platoonList[platoonIndex].addInventory('FWB', FWBonHand[0][0], FWBonHand[0][1], math.ceil(self.platoonList[platoonIndex].location / self.transportCapabilities[platoonIndex].speed))
+          platoon.addInventory('FWB', FWBonHand[0][0], FWBonHand[0][1], lead)
           demand[0] -= FWBonHand[0][0]
           cap -= FWBonHand[0][0]
           FWBonHand.pop(0)
         else:
-          self.platoonList[platoonIndex].addInventory('FWB', cap, FWBonHand[0][1], math.ceil(self.platoonList[platoonIndex].location / self.transportCapabilities[platoonIndex].speed))
+          platoon.addInventory('FWB', cap, FWBonHand[0][1], lead)
           demand[0] -= cap
           cap = 0
       if demand[1] > 0:
         if PlasmaOnHand[0][0] < cap:
-          self.platoonList[platoonIndex].addInventory('Plasma', PlasmaOnHand[0][0], PlasmaOnHand[0][1], math.ceil(self.platoonList[platoonIndex].location / self.transportCapabilities[platoonIndex].speed))
+          platoon.addInventory('Plasma', PlasmaOnHand[0][0], PlasmaOnHand[0][1], lead)
           demand[1] -= PlasmaOnHand[0][0]
           cap -= PlasmaOnHand[0][0]
           PlasmaOnHand.pop(0)
         else:
-          self.platoonList[platoonIndex].addInventory('Plasma', cap, PlasmaOnHand[0][1], math.ceil(self.platoonList[platoonIndex].location / self.transportCapabilities[platoonIndex].speed))
+          platoon.addInventory('Plasma', cap, PlasmaOnHand[0][1], lead)
           demand[1] -= cap
           cap = 0
     for j in FWBonHand:
       self.addInventory('FWB', j[0], j[1])
     for j in PlasmaOnHand:
       self.addInventory('Plasma', j[0], j[1])
-    return math.ceil(self.platoonList[platoonIndex].location / self.transportCapabilities[platoonIndex].speed), transport.capacity
+    return lead, transport.capacity
 
   def findInventory(self, FWBNeed, PlasmaNeed):
     """ method used to find units of inventory that can be used to satisfy demand
@@ -0,0 +1,128 @@
+import numpy as np
+
+PLASMA_SHARE = 0.02 #share of the transfusion demand that is Plasma, the rest is FWB
+
+class ParametricDemand:
+  """ The demand model of the original simulations. The casuality count on a day at combat level c is max(0, N(c, c / 2))
+      and the transfusion demand in pints is casualities * rate * Exp(mean) * pints.
+      Attributes :
+      spread - standard deviation of the casuality count as a share of the combat level
+      rate - share of casualities that need transfusions
+      mean - mean of the exponential transfusion factor
+      pints - pints per unit of the exponential transfusion factor """
+  def __init__(self, spread=0.5, rate=0.2, mean=0.1116, pints=4815):
+    self.spread = spread
+    self.rate = rate
+    self.mean = mean
+    self.pints = pints
+
+  def sample(self, levels, rng):
+    """ Draws the casualities and transfusion demand of every platoon-day in levels in two vectorised calls.
+        Args :
+        levels - array of combat levels of any shape
+        rng - numpy Generator, or the np.random module, used for the draws
+        Returns :
+        arrays of casualities and transfusion demand with the shape of levels """
+    levels = np.asarray(levels, dtype=float)
+    casualties = np.maximum(0, rng.normal(levels, levels * self.spread))
+    return casualties, casualties * self.rate * rng.exponential(self.mean, levels.shape) * self.pints
+
+  def sampleOne(self, level, rng):
+    """ Draws the casualities and transfusion demand of one platoon-day, consuming rng exactly as platoon.PlatoonDemand
+        always has so seeded runs reproduce """
+    casualties = max(0, rng.normal(level, level * self.spread))
+    return casualties, casualties * self.rate * rng.exponential(self.mean) * self.pints
+
+
+class EmpiricalDemand:
+  """ Demand model resampling tabulated transfusion demand, e.g. the output of Monte Carlo casuality studies.
+      A platoon-day at combat level c draws one of the values tabulated for level c with equal probability.
+      Attributes :
+      values - array (levels, width) of the demand values of each level, rows padded past their length
+      casualties - array (levels, width) of the casuality count of each value, NaN where not tabulated
+      lengths - array (levels,) of the number of values of each level """
+  def __init__(self, tables, casualties=None):
+    #tables - list with an entry for each combat level of the transfusion demand values observed at that level
+    #casualties - optional list of the same layout giving the casuality count behind each value
+    width = max(1, max(len(table) for table in tables))
+    self.values = np.zeros((len(tables), width))
+    self.casualties = np.full((len(tables), width), np.nan)
+    self.lengths = np.array([len(table) for table in tables], dtype=np.int64)
+    if (self.lengths == 0).any():
+      raise ValueError('every combat level needs at least one tabulated value')
+    for level, table in enumerate(tables):
+      self.values[level, :len(table)] = table
+      if casualties is not None:
+        self.casualties[level, :len(table)] = casualties[level]
+
+  @classmethod
+  def fromRecords(cls, levels, demand, casualties=None):
+    """ Builds the tables from flat records of (combat level, transfusion demand) observations """
+    levels = np.asarray(levels, dtype=np.int64)
+    demand = np.asarray(demand, dtype=float)
+    top = int(levels.max()) + 1
+    tables = [demand[levels == level] for level in range(top)]
+    perLevel = None if casualties is None else [np.asarray(casualties, dtype=float)[levels == level] for level in range(top)]
+    return cls(tables, perLevel)
+
+  def sample(self, levels, rng):
+    """ Draws the casualities and transfusion demand of every platoon-day in levels in one vectorised call """
+    levels = np.asarray(levels, dtype=np.int64)
+    if levels.size > 0 and (levels.min() < 0 or levels.max() >= len(self.lengths)):
+      raise ValueError('combat level outside the tabulated levels 0 to ' + str(len(self.lengths) - 1))
+    k = (rng.random(levels.shape) * self.lengths[levels]).astype(np.int64)
+    return self.casualties[levels, k], self.values[levels, k]
+
+  def sampleOne(self, level, rng):
+    """ Draws the casualities and transfusion demand of one platoon-day """
+    level = int(level)
+    if level < 0 or level >= len(self.lengths):
+      raise ValueError('combat level outside the tabulated levels 0 to ' + str(len(self.lengths) - 1))
+    k = int(rng.random() * self.lengths[level])
+    return self.casualties[level, k], self.values[level, k]
+
+
+class FunctionDemand:
+  """ User-defined demand model wrapping plain functions.
+      Attributes :
+      sampler - function sampler(levels, rng) returning arrays of casualities and transfusion demand shaped like levels
+      one - function one(level, rng) returning the casualities and demand of one platoon-day, None draws a batch of one """
+  def __init__(self, sampler, one=None):
+    self.sampler = sampler
+    self.one = one
+
+  def sample(self, levels, rng):
+    casualties, demand = self.sampler(np.asarray(levels), rng)
+    return np.asarray(casualties, dtype=float), np.asarray(demand, dtype=float)
+
+  def sampleOne(self, level, rng):
+    if self.one is not None:
+      return self.one(level, rng)
+    casualties, demand = self.sample(np.array([level]), rng)
+    return casualties[0], demand[0]
+
+
+MODELS = {} #registry from model name to demand model
+
+def register(name, model):
+  """ Registers a demand model under a name, so simulations can be given the name instead of the model """
+  MODELS[name] = model
+  return model
+
+def getModel(model=None):
+  """ Returns the demand model a simulation input stands for: the parametric model for None, the registered model for a
+      name, and the model itself otherwise """
+  if model is None:
+    return MODELS['parametric']
+  if isinstance(model, str):
+    if model not in MODELS:
+      raise KeyError('no demand model registered as ' + model + ', registered models are ' + ', '.join(sorted(MODELS)))
+    return MODELS[model]
+  return model
+
+def splitDemand(transfusionDemand):
+  """ Splits transfusion demand into its FWB and Plasma parts before rounding """
+  plasmaDemand = transfusionDemand * PLASMA_SHARE
+  return transfusionDemand - plasmaDemand, plasmaDemand
+
+register('parametric', ParametricDemand())
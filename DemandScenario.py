@@ -0,0 +1,130 @@
+import hashlib
+import os
+import numpy as np
+from DemandModels import getModel
+from CombatSchedule import isStatic, samplePaths, sampleCombatLevels
+
+ARRAYS = ['combatLevels', 'casualties', 'transfusionDemand', 'orderIntervals']
+
+class PlatoonScenario:
+  """ Pre-drawn random inputs of one platoon in one replication, consumed by Platoon and QRPlatoon.Platoon
+      in place of their own random draws.
+      Attributes :
+      combatLevels - combat level of every draw
+      casualties - number of casualities of every draw
+      transfusionDemand - total transfusion demand in pints of every draw
+      orderIntervals - days until the next order, entry 0 when the platoon is created and entry t when it orders on day t """
+  def __init__(self, combatLevels, casualties, transfusionDemand, orderIntervals=None):
+    self.combatLevels = combatLevels
+    self.casualties = casualties
+    self.transfusionDemand = transfusionDemand
+    self.orderIntervals = orderIntervals
+
+
+class DemandScenario:
+  """ Random inputs of a whole experiment drawn up front so that policies simulated against the same scenario share
+      common random numbers.
+      Arrays are indexed [replication, draw, platoon]; draw 0 is made when a platoon is created and draw t on day t.
+      The transport feedback simulation uses the combat level and demand of draw t on day t, the QR simulation
+      those of draw t - 1, as each engine does with its own random draws.
+      Attributes :
+      combatLevels - integer array (R, T + 1, n) of combat levels
+      casualties - array (R, T + 1, n) of casuality counts
+      transfusionDemand - array (R, T + 1, n) of transfusion demand in pints, split 98/2 into FWB and Plasma
+      orderIntervals - integer array (R, T + 1, n) of order interval draws, or None when not generated """
+  def __init__(self, combatLevels, casualties, transfusionDemand, orderIntervals=None):
+    self.combatLevels = combatLevels
+    self.casualties = casualties
+    self.transfusionDemand = transfusionDemand
+    self.orderIntervals = orderIntervals
+
+  @property
+  def R(self):
+    return self.combatLevels.shape[0]
+
+  @property
+  def T(self):
+    return self.combatLevels.shape[1] - 1
+
+  @property
+  def n(self):
+    return self.combatLevels.shape[2]
+
+  def platoon(self, r, i):
+    """ Returns the PlatoonScenario of platoon i in replication r """
+    intervals = None if self.orderIntervals is None else self.orderIntervals[r, :, i]
+    return PlatoonScenario(self.combatLevels[r, :, i], self.casualties[r, :, i], self.transfusionDemand[r, :, i], intervals)
+
+  def digest(self):
+    """ Returns a hex digest of the scenario's arrays, identifying it across runs e.g. as an EvaluationCache context """
+    h = hashlib.sha1()
+    for name in ARRAYS:
+      array = getattr(self, name)
+      if array is not None:
+        array = np.ascontiguousarray(array)
+        h.update((name + str(array.dtype) + str(array.shape)).encode())
+        h.update(array.tobytes())
+    return h.hexdigest()
+
+  def save(self, path):
+    """ Saves the scenario as a .npz file when path ends in .npz, otherwise as a directory of .npy files
+        that loadScenario can memory-map """
+    arrays = {name: getattr(self, name) for name in ARRAYS if getattr(self, name) is not None}
+    if path.endswith('.npz'):
+      np.savez(path, **arrays)
+      return
+    os.makedirs(path, exist_ok=True)
+    for name, array in arrays.items():
+      np.save(os.path.join(path, name + '.npy'), array)
+
+
+def loadScenario(path, mmap=True):
+  """ Loads a scenario written by DemandScenario.save.
+      Args :
+      path - .npz file or scenario directory
+      mmap - memory-map the arrays of a scenario directory instead of reading them into memory
+      Returns :
+      DemandScenario """
+  if path.endswith('.npz'):
+    with np.load(path) as data:
+      arrays = {name: data[name] for name in data.files}
+  else:
+    arrays = {}
+    for name in ARRAYS:
+      file = os.path.join(path, name + '.npy')
+      if os.path.exists(file):
+        arrays[name] = np.load(file, mmap_mode='r' if mmap else None)
+  return DemandScenario(**arrays)
+
+
+def generateScenario(R, T, CLMatrix, avgOrderInterval=None, maxOrderInterval=None, seed=None, demandModel=None):
+  """ Draws the random inputs of R replications of T days for every platoon in vectorised calls.
+      Args :
+      R - number of replications
+      T - number of days simulated
+      CLMatrix - list of length n of the combat level probabilities of each platoon, or of CombatSchedule schedules
+                 whose per-day tables are compiled once and sampled for all replications together
+      avgOrderInterval, maxOrderInterval - order interval inputs of TFSim, order intervals are drawn when given
+      seed - seed, SeedSequence or numpy Generator for the draws
+      demandModel - DemandModels model or registered name the casualities and demand are drawn from
+      Returns :
+      DemandScenario """
+  rng = seed if isinstance(seed, np.random.Generator) else np.random.default_rng(seed)
+  n = len(CLMatrix)
+  if isStatic(CLMatrix):
+    width = max(len(cl) for cl in CLMatrix)
+    cumulativeCL = np.full((n, width), np.inf)
+    for i in range(n):
+      cumulativeCL[i, :len(CLMatrix[i])] = np.cumsum(CLMatrix[i])
+    combatLevels = sampleCombatLevels(cumulativeCL, (R, T + 1, n), rng).astype(np.int8)
+  else:
+    combatLevels = samplePaths(CLMatrix, R, T, rng).astype(np.int8)
+  casualties, transfusionDemand = getModel(demandModel).sample(combatLevels, rng)
+
+  orderIntervals = None
+  if avgOrderInterval is not None:
+    avgI = np.array(avgOrderInterval, dtype=float)
+    maxI = np.array(maxOrderInterval, dtype=float)
+    minI = np.maximum(1, avgI - (maxI - avgI))
+    orderIntervals = np.rint(rng.triangular(np.broadcast_to(minI, (R, T + 1, n)), avgI, maxI)).astype(np.int32)
+  return DemandScenario(combatLevels, casualties, transfusionDemand, orderIntervals)
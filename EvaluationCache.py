@@ -0,0 +1,179 @@
+import hashlib
+import json
+import sqlite3
+import numpy as np
+
+def digest(*parts):
+    """ Returns a hex digest of JSON-serialisable parts, e.g. the inputs of a model, usable as an EvaluationCache context """
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=_jsonDefault).encode()).hexdigest()
+
+def _jsonDefault(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if hasattr(value, 'draw'): #CombatSchedule schedule in a CLMatrix
+        return [type(value).__name__, vars(value)]
+    raise TypeError(f'cannot digest {type(value).__name__}')
+
+def seedKey(seed):
+    """ Returns a string identifying an integer or SeedSequence seed, None when the seed does not fix the random draws """
+    if seed is None:
+        return None
+    if isinstance(seed, np.random.SeedSequence):
+        return json.dumps([str(seed.entropy), list(seed.spawn_key), seed.pool_size])
+    return json.dumps(int(seed))
+
+def policyKey(x):
+    """ Returns the canonical string of a policy vector, integral values are stored as integers """
+    return json.dumps([int(v) if float(v).is_integer() else float(v) for v in x])
+
+
+class EvaluationCache:
+  """ Disk-backed memo of simulation scores that persists across studies.
+      An evaluation is keyed by its context, policy vector, horizon and seed. The context identifies everything else the
+      score depends on, e.g. DemandScenario.digest() or digest() of the model inputs. Scores are written as soon as they
+      are known, so an interrupted study loses nothing, and the least recently used entries are evicted once the cache
+      holds more than maxEntries.
+      Attributes :
+      path - SQLite database file, ':memory:' keeps the cache in this process only
+      maxEntries - largest number of evaluations kept, unlimited when None
+      connection - open sqlite3 connection, reopened after the cache is unpickled in a worker process """
+  def __init__(self, path, maxEntries=None):
+    self.path = path
+    self.maxEntries = maxEntries
+    self.connection = None
+    self._connect()
+
+  def _connect(self):
+    self.connection = sqlite3.connect(self.path)
+    self.connection.execute('''CREATE TABLE IF NOT EXISTS evaluations (
+      context TEXT NOT NULL, policy TEXT NOT NULL, horizon INTEGER NOT NULL, seed TEXT NOT NULL,
+      score REAL NOT NULL, used INTEGER NOT NULL, PRIMARY KEY (context, policy, horizon, seed))''')
+    self.connection.execute('CREATE INDEX IF NOT EXISTS evaluations_used ON evaluations (used)')
+    self.connection.execute('CREATE INDEX IF NOT EXISTS evaluations_study ON evaluations (context, horizon, seed)')
+    self.connection.commit()
+
+  def __getstate__(self):
+    state = self.__dict__.copy()
+    state['connection'] = None
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self._connect()
+
+  def _tick(self):
+    # recency counter of the LRU order, persisted with the entries
+    return self.connection.execute('SELECT COALESCE(MAX(used), 0) + 1 FROM evaluations').fetchone()[0]
+
+  def get(self, context, x, horizon, seed):
+    """ Returns the cached score of policy x, or None when it has not been evaluated or the seed is None """
+    if seedKey(seed) is None:
+      return None
+    key = (context, policyKey(x), horizon, seedKey(seed))
+    row = self.connection.execute('SELECT score FROM evaluations WHERE context = ? AND policy = ? AND horizon = ? AND seed = ?', key).fetchone()
+    if row is None:
+      return None
+    self.connection.execute('UPDATE evaluations SET used = ? WHERE context = ? AND policy = ? AND horizon = ? AND seed = ?', (self._tick(),) + key)
+    self.connection.commit()
+    return row[0]
+
+  def put(self, context, x, horizon, seed, score):
+    """ Stores the score of policy x and evicts the least recently used entries beyond maxEntries.
+        Nothing is stored when the seed is None, as the score could not be reproduced """
+    if seedKey(seed) is None:
+      return
+    self.connection.execute('INSERT OR REPLACE INTO evaluations VALUES (?, ?, ?, ?, ?, ?)',
+                            (context, policyKey(x), horizon, seedKey(seed), float(score), self._tick()))
+    if self.maxEntries is not None:
+      self.connection.execute('DELETE FROM evaluations WHERE used <= (SELECT used FROM evaluations ORDER BY used DESC LIMIT 1 OFFSET ?)',
+                              (self.maxEntries,))
+    self.connection.commit()
+
+  def points(self, context, horizon, seed, bounds=None):
+    """ Returns the cached policies and scores of one study as lists (x0, y0) to warm-start gp_minimize or an Optimizer.
+        Args :
+        context, horizon, seed - study to look up
+        bounds - list of (low, high) bounds, policies outside them are left out
+        Returns :
+        x0 - list of policy vectors
+        y0 - list of their scores """
+    rows = self.connection.execute('SELECT policy, score FROM evaluations WHERE context = ? AND horizon = ? AND seed = ? ORDER BY used',
+                                   (context, horizon, seedKey(seed))).fetchall()
+    x0 = []
+    y0 = []
+    for policy, score in rows:
+      x = json.loads(policy)
+      if bounds is None or (len(x) == len(bounds) and all(low <= v <= high for v, (low, high) in zip(x, bounds))):
+        x0.append(x)
+        y0.append(score)
+    return x0, y0
+
+  def __len__(self):
+    return self.connection.execute('SELECT COUNT(*) FROM evaluations').fetchone()[0]
+
+  def close(self):
+    self.connection.close()
+
+
+class CachedObjective:
+  """ Objective that consults an EvaluationCache before simulating and stores every new score in it.
+      Attributes :
+      fn - callable fn(x, seed=seed, **kwargs) returning the score of policy x, e.g. QRSimulation.sim
+      cache - EvaluationCache
+      context - string identifying the model inputs or scenario
+      horizon - number of days simulated
+      seed - integer or SeedSequence every evaluation runs with
+      kwargs - extra keyword arguments passed on to fn, e.g. scenario and replication
+      hits - number of evaluations answered from the cache """
+  def __init__(self, fn, cache, context, horizon, seed, **kwargs):
+    if seedKey(seed) is None:
+      raise ValueError('a seed is needed to cache evaluations')
+    self.fn = fn
+    self.cache = cache
+    self.context = context
+    self.horizon = horizon
+    self.seed = seed
+    self.kwargs = kwargs
+    self.hits = 0
+
+  def __call__(self, x):
+    score = self.cache.get(self.context, x, self.horizon, self.seed)
+    if score is not None:
+      self.hits += 1
+      return score
+    score = self.fn(x, seed=self.seed, **self.kwargs)
+    self.cache.put(self.context, x, self.horizon, self.seed, score)
+    return score
+
+  def points(self, bounds=None):
+    """ Returns the (x0, y0) already cached for this objective """
+    return self.cache.points(self.context, self.horizon, self.seed, bounds)
+
+
+class CachedSimulation:
+  """ Replication-level counterpart of CachedObjective for callers that pick the seed of every call, such as
+      PolicyRacing.RacingObjective, whose scores depend on its incumbent history and cannot be cached themselves.
+      Attributes :
+      fn - callable fn(x, seed=seed, **kwargs) returning the score of one replication, e.g. QRSimulation.sim
+      cache, context, horizon, kwargs - as for CachedObjective
+      hits - number of replications answered from the cache """
+  def __init__(self, fn, cache, context, horizon, **kwargs):
+    self.fn = fn
+    self.cache = cache
+    self.context = context
+    self.horizon = horizon
+    self.kwargs = kwargs
+    self.hits = 0
+
+  def __call__(self, x, seed):
+    if seedKey(seed) is None:
+      raise ValueError('a seed is needed to cache evaluations')
+    score = self.cache.get(self.context, x, self.horizon, seed)
+    if score is not None:
+      self.hits += 1
+      return score
+    score = self.fn(x, seed=seed, **self.kwargs)
+    self.cache.put(self.context, x, self.horizon, seed, score)
+    return score
@@ -0,0 +1,85 @@
+import heapq
+import math
+from collections import deque
+from Routing import apportion
+
+class FleetDispatcher:
+  """ Shared pool of transports that serves the orders of every platoon of a company.
+      An availability calendar, a heap of (day the transport is next free, transport index), hands each order the
+      transport that has been free longest, so a day's orders are dispatched in O(orders log fleet). A transport is
+      away for the round trip, twice its lead time to the platoon, and orders that find no free transport wait in
+      order of arrival for the next day. Lead times are precomputed for every (transport, platoon) pair.
+      With a Router, the orders waiting on a day are first batched into multi-stop tours that fit the smallest
+      transport, and each tour takes one transport for the sum of its legs. The transport days a tour saves show up in
+      the TransDays reported for its stops, half the tour's days split in proportion to the stops' own lead times.
+      Attributes :
+      transports - list of Transport objects in the pool
+      lead - lead[k][i] is the number of days transport k takes to reach platoon i
+      calendar - heap of (day the transport is next free, transport index)
+      waiting - queue of (platoon index, order) not yet dispatched
+      day - number of days dispatched
+      router - Routing.Router building multi-stop tours, None sends every order on its own round trip """
+  def __init__(self, transports, platoons, router=None):
+    self.transports = transports
+    self.router = router
+    self.lead = [[math.ceil(p.location / t.speed) for p in platoons] for t in transports]
+    self.calendar = [(0, k) for k in range(len(transports))]
+    self.waiting = deque()
+    self.day = 0
+
+  def dispatch(self, orders):
+    """ Moves the calendar to the next day and assigns that day's orders together with any still waiting.
+        Args :
+        orders - list of (platoon index, [FWB units, Plasma units]) orders placed today
+        Returns :
+        list of (Transport, stops) of the tours dispatched today, stops a list of (platoon index, order, lead time,
+        transport days reported) in visiting order """
+    self.day += 1
+    self.waiting.extend(orders)
+    if self.router is not None:
+      return self._dispatchTours()
+    dispatched = []
+    while len(self.waiting) > 0 and len(self.calendar) > 0 and self.calendar[0][0] <= self.day:
+      free, k = heapq.heappop(self.calendar)
+      platoonIndex, demand = self.waiting.popleft()
+      lead = self.lead[k][platoonIndex]
+      heapq.heappush(self.calendar, (self.day + 2 * lead, k))
+      dispatched.append((self.transports[k], [(platoonIndex, demand, lead, lead)]))
+    return dispatched
+
+  def _dispatchTours(self):
+    if len(self.waiting) == 0 or len(self.calendar) == 0 or self.calendar[0][0] > self.day:
+      return []
+    waiting = list(self.waiting)
+    self.waiting.clear()
+    platoons = [platoonIndex for platoonIndex, demand in waiting]
+    capacity = min(t.capacity for t in self.transports)
+    tours = self.router.route(platoons, [demand[0] + demand[1] for platoonIndex, demand in waiting], capacity)
+    # tours holding the longest waiting orders go first, the rest wait for the next day
+    tours.sort(key=min)
+    dispatched = []
+    left = []
+    for tour in tours:
+      if len(self.calendar) == 0 or self.calendar[0][0] > self.day:
+        left += tour
+        continue
+      free, k = heapq.heappop(self.calendar)
+      legs = self.router.legDays(tour, platoons, self.transports[k].speed)
+      heapq.heappush(self.calendar, (self.day + sum(legs), k))
+      shares = apportion(math.ceil(sum(legs) / 2), [self.lead[k][platoons[s]] for s in tour])
+      arrival = 0
+      stops = []
+      for s, leg, share in zip(tour, legs, shares):
+        arrival += leg
+        stops.append((platoons[s], waiting[s][1], arrival, share))
+      dispatched.append((self.transports[k], stops))
+    self.waiting.extend(waiting[s] for s in sorted(left))
+    return dispatched
+
+  def nextFree(self):
+    """ Returns the day the next transport becomes free """
+    return self.calendar[0][0] if len(self.calendar) > 0 else math.inf
+
+  def available(self):
+    """ Returns the number of transports free on the current day """
+    return sum(1 for free, k in self.calendar if free <= self.day)
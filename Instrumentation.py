@@ -0,0 +1,213 @@
+import json
+import time
+import platoon
+from BloodProductStorage import BloodProductStorage
+from BucketProductStorage import BucketProductStorage
+from Company import Company
+
+BUCKETS = 64 #log2 buckets of the wall-time histograms, bucket b counts calls of 2^(b-1) to 2^b - 1 nanoseconds
+
+# phases timed, as (owner, attribute, phase name); owners are patched in place while instrumentation is on
+PHASES = [
+  (BloodProductStorage, 'timestep', 'storage_timestep'),
+  (BucketProductStorage, 'timestep', 'storage_timestep'),
+  (BloodProductStorage, 'use', 'storage_use'),
+  (BucketProductStorage, 'use', 'storage_use'),
+  (BloodProductStorage, 'export', 'storage_export'),
+  (BucketProductStorage, 'export', 'storage_export'),
+  (platoon.Platoon, 'usage', 'platoon_usage'),
+  (platoon, 'PlatoonDemand', 'platoon_demand'),
+  (Company, 'orderPlanning', 'company_orderPlanning'),
+  (Company, 'ship', 'company_ship'),
+  (Company, 'findInventory', 'company_findInventory'),
+  (Company, 'timeStep', 'company_timeStep'),
+]
+
+COUNTERS = ['lots_stored', 'units_stored', 'use_calls', 'export_calls', 'lots_scanned', 'orders', 'shipments', 'days']
+
+def _lotCount(storage):
+  """ Number of lots on hand in a BloodProductStorage or BucketProductStorage """
+  if isinstance(storage, BucketProductStorage):
+    return sum(len(bucket) for bucket in storage.buckets)
+  return len(storage.onHand)
+
+
+class Instrumentation:
+  """ Switchable timing and counter instrumentation of the transport feedback simulation's hot paths.
+      While enabled, the methods listed in PHASES are replaced by wrappers that record their wall time into log2
+      histograms, and the storage and company methods also update counters. Disabling restores the original methods,
+      so a run without instrumentation executes exactly the code it would if this module was never imported.
+      Times are inclusive, e.g. company_timeStep contains the platoon and storage phases it calls.
+      Only one Instrumentation can be enabled at a time. It is also a context manager:
+        with Instrumentation() as inst:
+          TFSim(...)
+        print(inst.toPrometheus())
+      Attributes :
+      histograms - dictionary from phase name to the list of BUCKETS call counts
+      seconds - dictionary from phase name to the total wall time in seconds
+      calls - dictionary from phase name to the number of calls
+      counters - dictionary of lots_stored and units_stored (lots added to any storage), use_calls and export_calls,
+                 lots_scanned (lots emptied or split by use and export), orders (platoon orders shipped),
+                 shipments (lots shipped to platoons) and days (company timesteps)
+      dailyOrders, dailyShipments - log2 histograms of the orders and shipments of each day
+      lotsScanned - log2 histogram of the lots scanned by each use and export call
+      originals - methods replaced while enabled """
+  active = None
+
+  def __init__(self):
+    self.reset()
+    self.originals = []
+
+  def reset(self):
+    """ Clears all histograms and counters """
+    names = sorted(set(phase for owner, attribute, phase in PHASES))
+    self.histograms = {phase: [0] * BUCKETS for phase in names}
+    self.nanoseconds = {phase: 0 for phase in names}
+    self.calls = {phase: 0 for phase in names}
+    self.counters = {name: 0 for name in COUNTERS}
+    self.dailyOrders = [0] * BUCKETS
+    self.dailyShipments = [0] * BUCKETS
+    self.lotsScanned = [0] * BUCKETS
+    self._day = [0, 0]
+    self._shipped = 0
+
+  @property
+  def seconds(self):
+    return {phase: ns / 1e9 for phase, ns in self.nanoseconds.items()}
+
+  def enable(self):
+    if Instrumentation.active is not None:
+      raise RuntimeError('another Instrumentation is already enabled')
+    Instrumentation.active = self
+    for owner, attribute, phase in PHASES:
+      original = getattr(owner, attribute)
+      self.originals.append((owner, attribute, original))
+      setattr(owner, attribute, self._wrap(owner, attribute, phase, original))
+    return self
+
+  def disable(self):
+    for owner, attribute, original in reversed(self.originals):
+      setattr(owner, attribute, original)
+    self.originals = []
+    if Instrumentation.active is self:
+      Instrumentation.active = None
+
+  def __enter__(self):
+    return self.enable()
+
+  def __exit__(self, *exc):
+    self.disable()
+    return False
+
+  def _wrap(self, owner, attribute, phase, original):
+    histogram = self.histograms[phase]
+    counters = self.counters
+    clock = time.perf_counter_ns
+    inst = self
+
+    def record(elapsed):
+      histogram[min(elapsed.bit_length(), BUCKETS - 1)] += 1
+      inst.nanoseconds[phase] += elapsed
+      inst.calls[phase] += 1
+
+    if attribute in ('use', 'export'):
+      def wrapper(storage, units):
+        before = _lotCount(storage)
+        start = clock()
+        try:
+          return original(storage, units)
+        finally:
+          record(clock() - start)
+          after = _lotCount(storage)
+          scanned = before - after + (1 if units > 0 and after > 0 else 0)
+          counters[attribute + '_calls'] += 1
+          counters['lots_scanned'] += scanned
+          inst.lotsScanned[min(scanned.bit_length(), BUCKETS - 1)] += 1
+    elif attribute == 'ship':
+      def wrapper(company, demand, platoonIndex, transport, lead):
+        lots = inst._shipped
+        start = clock()
+        try:
+          return original(company, demand, platoonIndex, transport, lead)
+        finally:
+          record(clock() - start)
+          shipped = inst._shipped - lots
+          counters['orders'] += 1
+          counters['shipments'] += shipped
+          inst._day[0] += 1
+          inst._day[1] += shipped
+    elif attribute == 'timeStep' and owner is Company:
+      def wrapper(company, *args, **kwargs):
+        inst._day = [0, 0]
+        start = clock()
+        try:
+          return original(company, *args, **kwargs)
+        finally:
+          record(clock() - start)
+          counters['days'] += 1
+          inst.dailyOrders[inst._day[0].bit_length()] += 1
+          inst.dailyShipments[min(inst._day[1].bit_length(), BUCKETS - 1)] += 1
+    else:
+      def wrapper(*args, **kwargs):
+        start = clock()
+        try:
+          return original(*args, **kwargs)
+        finally:
+          record(clock() - start)
+
+    if attribute == 'timestep':
+      # lots stored are counted through add, which is wrapped together with timestep
+      add = owner.add
+      def addWrapper(storage, NumUnits, Exp, Arrival):
+        counters['lots_stored'] += 1
+        counters['units_stored'] += NumUnits
+        return add(storage, NumUnits, Exp, Arrival)
+      self.originals.append((owner, 'add', add))
+      owner.add = addWrapper
+    elif attribute == 'ship':
+      # lots shipped are counted through Platoon.addInventory, which is wrapped together with ship, so lots delivered
+      # on hand with lead 0 are counted as well as those put in transit
+      addInventory = platoon.Platoon.addInventory
+      def addInventoryWrapper(receiver, productType, quantity, expires, arrival):
+        inst._shipped += 1
+        return addInventory(receiver, productType, quantity, expires, arrival)
+      self.originals.append((platoon.Platoon, 'addInventory', addInventory))
+      platoon.Platoon.addInventory = addInventoryWrapper
+    return wrapper
+
+  def toDict(self):
+    """ Returns every histogram and counter as a JSON-serialisable dictionary """
+    return {
+      'phases': {phase: {'calls': self.calls[phase], 'seconds': self.nanoseconds[phase] / 1e9,
+                         'log2_ns_histogram': self.histograms[phase]} for phase in self.histograms},
+      'counters': dict(self.counters),
+      'daily_orders_log2_histogram': self.dailyOrders,
+      'daily_shipments_log2_histogram': self.dailyShipments,
+      'lots_scanned_log2_histogram': self.lotsScanned,
+    }
+
+  def toJSON(self, path=None):
+    """ Returns the instrumentation as a JSON string, also writing it to path when given """
+    text = json.dumps(self.toDict(), indent=2)
+    if path is not None:
+      with open(path, 'w') as f:
+        f.write(text)
+    return text
+
+  def toPrometheus(self, prefix='bloodtool'):
+    """ Returns the instrumentation in the Prometheus text exposition format """
+    lines = [f'# HELP {prefix}_phase_seconds Wall time of simulation phases, inclusive of the phases they call',
+             f'# TYPE {prefix}_phase_seconds histogram']
+    for phase, histogram in self.histograms.items():
+      cumulative = 0
+      for b, count in enumerate(histogram):
+        cumulative += count
+        if count > 0 or b == BUCKETS - 1:
+          le = '+Inf' if b == BUCKETS - 1 else repr((2 ** b) / 1e9)
+          lines.append(f'{prefix}_phase_seconds_bucket{{phase="{phase}",le="{le}"}} {cumulative}')
+      lines.append(f'{prefix}_phase_seconds_sum{{phase="{phase}"}} {self.nanoseconds[phase] / 1e9!r}')
+      lines.append(f'{prefix}_phase_seconds_count{{phase="{phase}"}} {self.calls[phase]}')
+    for name, value in self.counters.items():
+      lines.append(f'# TYPE {prefix}_{name}_total counter')
+      lines.append(f'{prefix}_{name}_total {value}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,70 @@
+import heapq
+import numpy as np
+from BloodProductStorage import BloodProductStorage
+from SimulationResult import SimulationResult
+from TransportFeedbackSim import buildCompany
+from DemandModels import splitDemand
+
+def busyDays(transfusionDemand):
+    """ Returns the sorted days t >= 1 on which a platoon's pre-drawn demand rounds to at least one unit of FWB or
+        Plasma, computed the way PlatoonDemand and Platoon.usage do """
+    FWB, plasma = splitDemand(np.asarray(transfusionDemand, dtype=float))
+    busy = (np.rint(FWB) != 0) | (np.rint(plasma) != 0)
+    busy[0] = False
+    return np.flatnonzero(busy).tolist()
+
+def nextEvent(platoon, day, busy, k):
+    """ Returns the first day after day on which the platoon can do anything: order, receive, expire or use blood """
+    candidates = [day + platoon.orderCountDown, platoon.FWBinventory.nextArrival(), platoon.Plasmainventory.nextArrival(),
+                  platoon.FWBinventory.nextExpiry(), platoon.Plasmainventory.nextExpiry()]
+    if k < len(busy):
+        candidates.append(busy[k])
+    return max(day + 1, min(candidates))
+
+def TFSimEvents(T, n, l, avgOrderInterval, maxOrderInterval, TargetInv, PI, CI, CLMatrix, scenario, replication=0, storage=BloodProductStorage, asResult=False):
+    #next-event version of TFSim for scenarios in which most platoon-days are quiet, e.g. long stretches at combat level 0
+    #the arguments are those of TFSim and the output is identical to TFSim(..., scenario=scenario, replication=replication)
+    #scenario - DemandScenario with order intervals, as generateScenario draws when given the order interval inputs
+    #instead of stepping every platoon every day, a heap holds each platoon's next event day: its order countdown running
+    #out, the next arrival or expiry in its storages or the next day its pre-drawn demand is non-zero. Platoons skip
+    #straight to the day before their next event and only event days are simulated, so the work grows with the number
+    #of events instead of T * n. Quiet days write no output, their rows are all zero under the daily kernel too
+    if scenario.orderIntervals is None:
+        raise ValueError('the next-event kernel needs a scenario with pre-drawn order intervals')
+    company = buildCompany(n, l, avgOrderInterval, maxOrderInterval, TargetInv, PI, CI, CLMatrix, storage, scenario=scenario, replication=replication)
+    platoons = company.platoonList
+    busy = [busyDays(scenario.transfusionDemand[replication, :T + 1, i]) for i in range(n)]
+    pointer = [0] * n
+    events = [(nextEvent(platoons[i], 0, busy[i], 0), i) for i in range(n)]
+    heapq.heapify(events)
+
+    result = SimulationResult(T, n)
+    while len(events) > 0 and events[0][0] <= T:
+        day = events[0][0]
+        company.FWBinventory.advance(day)
+        company.Plasmainventory.advance(day)
+        # platoons with an event on the same day run in index order, as Company.timeStep runs them
+        due = []
+        while len(events) > 0 and events[0][0] == day:
+            due.append(heapq.heappop(events)[1])
+        for i in sorted(due):
+            platoon = platoons[i]
+            platoon.skipTo(day - 1)
+            demand, FWBU, PlasmaU, FWBE, PlasmaE = platoon.timeStep()
+            tDays, tSpace = company.orderPlanning(demand, i)
+            result.data[day - 1, i] = (tDays, tSpace, FWBU, PlasmaU, FWBE, PlasmaE)
+            while pointer[i] < len(busy[i]) and busy[i][pointer[i]] <= day:
+                pointer[i] += 1
+            heapq.heappush(events, (nextEvent(platoon, day, busy[i], pointer[i]), i))
+
+    # leave every storage at day T, as the daily kernel does
+    company.FWBinventory.advance(T)
+    company.Plasmainventory.advance(T)
+    for platoon in platoons:
+        if platoon.draw < T:
+            platoon.skipTo(T)
+    result.days = T
+    result.flush()
+    if asResult:
+        return result
+    return result.toDF()
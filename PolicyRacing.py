@@ -0,0 +1,108 @@
+import itertools
+import math
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from RandomStreams import spawnSeeds
+
+def policyGrid(bounds, steps):
+    """ Builds an evenly spaced grid of integer policy vectors.
+        Args :
+        bounds - list of (low, high) bounds of every input, as passed to gp_minimize
+        steps - number of grid points per input
+        Returns :
+        list of policy vectors """
+    axes = [sorted(set(int(round(v)) for v in np.linspace(low, high, steps))) for low, high in bounds]
+    return [list(x) for x in itertools.product(*axes)]
+
+
+def successiveHalving(candidates, evaluate, minReps=2, eta=3, maxReps=None, seed=None, workers=1):
+    """ Races candidate policies with successive halving.
+        Every candidate first gets minReps replications. After each rung only the best 1/eta of the candidates by
+        mean score survive and their replication count is multiplied by eta, until one candidate is left or maxReps
+        is reached. Replication j runs with the same seed for every candidate, so candidates are compared under
+        common random numbers, and replications already run are reused in later rungs.
+        Args :
+        candidates - list of policy vectors
+        evaluate - picklable callable evaluate(candidate, seed) returning a score to minimise, e.g. QRSimulation.sim
+        minReps - replications per candidate in the first rung
+        eta - reduction factor between rungs
+        maxReps - largest number of replications any candidate gets, unlimited when None
+        seed - master seed the replication seeds are spawned from
+        workers - number of worker processes, 1 evaluates in this process
+        Returns :
+        dictionary with the best candidate, its mean score, and the mean scores and replication counts of all candidates
+    """
+    if maxReps is None:
+        maxReps = minReps * eta ** math.ceil(math.log(max(len(candidates), 1), eta))
+    seeds = spawnSeeds(seed, maxReps)
+    scores = [[] for c in candidates]
+    alive = list(range(len(candidates)))
+    reps = minReps
+    pool = None if workers == 1 else ProcessPoolExecutor(max_workers=workers)
+    try:
+        while True:
+            reps = min(reps, maxReps)
+            tasks = [(i, j) for i in alive for j in range(len(scores[i]), reps)]
+            if pool is None:
+                results = [evaluate(candidates[i], seeds[j]) for i, j in tasks]
+            else:
+                results = pool.map(evaluate, [candidates[i] for i, j in tasks], [seeds[j] for i, j in tasks])
+            for (i, j), score in zip(tasks, results):
+                scores[i].append(score)
+            alive.sort(key=lambda i: np.mean(scores[i]))
+            if len(alive) == 1 or reps == maxReps:
+                break
+            alive = alive[:max(1, len(alive) // eta)]
+            reps *= eta
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    best = alive[0]
+    return {
+        "best": candidates[best],
+        "score": float(np.mean(scores[best])),
+        "means": [float(np.mean(s)) for s in scores],
+        "reps": [len(s) for s in scores],
+    }
+
+
+class RacingObjective:
+  """ Objective for gp_minimize that spends replications where the decision is uncertain.
+      A candidate starts with minReps replications and gets eta times more until it reaches maxReps, unless its mean
+      is already clearly worse than the incumbent, the best mean among candidates that reached maxReps.
+      Replication j runs with the same seed for every candidate.
+      Attributes :
+      simulate - callable simulate(x, seed=...) returning the score of one replication, e.g. QRSimulation.sim
+      seed - integer or SeedSequence the replication seeds are spawned from
+      minReps, maxReps, eta - replication schedule of each candidate
+      z - number of standard errors a candidate's mean must lie above the incumbent to be dropped
+      incumbent - best mean score of a candidate that received maxReps replications
+      reps - total number of replications run """
+  def __init__(self, simulate, minReps=2, maxReps=16, eta=2, z=2.0, seed=None):
+    self.simulate = simulate
+    self.minReps = minReps
+    self.maxReps = maxReps
+    self.eta = eta
+    self.z = z
+    self.seed = seed
+    self.seeds = spawnSeeds(seed, maxReps)
+    self.incumbent = math.inf
+    self.reps = 0
+
+  def __call__(self, x):
+    scores = []
+    target = self.minReps
+    while True:
+      target = min(target, self.maxReps)
+      for j in range(len(scores), target):
+        scores.append(self.simulate(x, seed=self.seeds[j]))
+      mean = float(np.mean(scores))
+      stdErr = float(np.std(scores, ddof=1) / math.sqrt(len(scores))) if len(scores) > 1 else math.inf
+      if target == self.maxReps or mean - self.z * stdErr > self.incumbent:
+        break
+      target *= self.eta
+    self.reps += len(scores)
+    if len(scores) == self.maxReps:
+      self.incumbent = min(self.incumbent, mean)
+    return mean
@@ -0,0 +1,125 @@
+import cProfile
+import os
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+
+class SamplingProfiler:
+  """ Statistical profiler that samples the call stack of one thread from a background thread.
+      Samples are written in the collapsed stack format, one 'outer;...;inner count' line per distinct stack, that
+      flamegraph.pl, speedscope and inferno read.
+      Attributes :
+      interval - seconds between samples, the interpreter's switch interval bounds how often a sample can be taken
+      samples - Counter from collapsed stack to number of samples
+      threadId - thread being sampled, the thread that started the profiler """
+  def __init__(self, interval=0.001):
+    self.interval = interval
+    self.samples = Counter()
+    self.threadId = None
+    self._stop = threading.Event()
+    self._thread = None
+
+  def start(self):
+    self.threadId = threading.get_ident()
+    self._stop.clear()
+    self._thread = threading.Thread(target=self._run, daemon=True)
+    self._thread.start()
+
+  def stop(self):
+    self._stop.set()
+    self._thread.join()
+
+  def _run(self):
+    while not self._stop.wait(self.interval):
+      frame = sys._current_frames().get(self.threadId)
+      stack = []
+      while frame is not None:
+        code = frame.f_code
+        stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+      if len(stack) > 0:
+        self.samples[';'.join(reversed(stack))] += 1
+
+  def write(self, path):
+    """ Writes the samples in the collapsed stack format """
+    with open(path, 'w') as f:
+      for stack, count in self.samples.most_common():
+        f.write(f'{stack} {count}\n')
+
+
+class MemorySnapshots:
+  """ Day callback for TFSim that takes a tracemalloc snapshot every few simulated days.
+      Every snapshot is dumped to '<prefix>.day<d>.tracemalloc', which tracemalloc.Snapshot.load reads back, and the
+      allocation sites that grew most since the first snapshot are appended to '<prefix>.memory.txt'.
+      Attributes :
+      every - number of days between snapshots
+      prefix - path prefix of the snapshot files
+      top - number of allocation sites listed per snapshot
+      first - first snapshot taken, the reference the growth is measured against
+      paths - files written so far """
+  def __init__(self, every, prefix, top=15):
+    self.every = every
+    self.prefix = prefix
+    self.top = top
+    self.first = None
+    self.paths = [f'{prefix}.memory.txt']
+    open(self.paths[0], 'w').close()
+
+  def __call__(self, day, company=None):
+    if day % self.every == 0:
+      self.snapshot(day)
+
+  def snapshot(self, day):
+    if not tracemalloc.is_tracing():
+      tracemalloc.start()
+    snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+    path = f'{self.prefix}.day{day}.tracemalloc'
+    snapshot.dump(path)
+    self.paths.append(path)
+    report = f'{self.prefix}.memory.txt'
+    with open(report, 'a') as f:
+      current, peak = tracemalloc.get_traced_memory()
+      f.write(f'day {day}: {current / 1024:.1f} KiB traced, peak {peak / 1024:.1f} KiB\n')
+      if self.first is None:
+        stats = snapshot.statistics('lineno')
+      else:
+        stats = snapshot.compare_to(self.first, 'lineno')
+      for stat in stats[:self.top]:
+        f.write(f'  {stat}\n')
+    if self.first is None:
+      self.first = snapshot
+
+
+def profileRun(fn, prefix, sampleInterval=0.001, memoryEvery=None):
+  """ Runs a simulation under cProfile and the sampling profiler, optionally taking tracemalloc snapshots.
+      Writes '<prefix>.pstats', readable with pstats or snakeviz, and '<prefix>.collapsed' for flamegraph tools.
+      Args :
+      fn - callable running the simulation, called as fn(onDay) with the day callback to pass on to TFSim, None when not
+           taking memory snapshots
+      prefix - path prefix of the output files
+      sampleInterval - seconds between stack samples
+      memoryEvery - take a tracemalloc snapshot every this many simulated days, and at the end of the run, None for never
+      Returns :
+      the result of fn and the list of files written """
+  memory = None if memoryEvery is None else MemorySnapshots(memoryEvery, prefix)
+  if memory is not None:
+    tracemalloc.start()
+    memory.snapshot(0)
+  sampler = SamplingProfiler(sampleInterval)
+  profiler = cProfile.Profile()
+  sampler.start()
+  profiler.enable()
+  try:
+    result = fn(memory)
+  finally:
+    profiler.disable()
+    sampler.stop()
+  paths = [prefix + '.pstats', prefix + '.collapsed']
+  profiler.dump_stats(paths[0])
+  sampler.write(paths[1])
+  if memory is not None:
+    memory.snapshot('end')
+    tracemalloc.stop()
+    paths += memory.paths
+  return result, paths
@@ -3,8 +3,8 @@ import numpy as np
 from QRTransport import *
 class Company:
   def __init__(self, FWBinventory, Plasmainventory, transport, platoons):
-    self.FWBinventoryArray = FWBinventory #List of BloodInventoryUnit with the productType 'FWB' that the Company has on hand
-    self.PlasmainventoryArray = Plasmainventory #List of BloodInventoryUnit with the productType 'Plasma' that the Company has on hand
+    self.FWBinventory = FWBinventory #BloodProductStorage of the Fresh Whole Blood the Company has on hand
+    self.Plasmainventory = Plasmainventory #BloodProductStorage of the Plasma the Company has on hand
     self.transportCapabilities = transport #List of Transport objects that provide the transport available to the company for BloodInventoryUnit delivery
     self.platoonList = platoons #List of medical platoons that the company services
 
@@ -14,10 +14,8 @@ class Company:
     for unit in self.transportCapabilities:
       unit.availcount = np.max(unit.availcount-1,0)
       availUpdate(unit)
-    for unit in self.FWBinventoryArray:
-      unit.hold()
-    for unit in self.PlasmainventoryArray:
-      unit.hold()
+    self.FWBinventory.timestep()
+    self.Plasmainventory.timestep()
     FWBInventory = []
     PlasmaInventory = []
     unMetFWBDemand = []
@@ -26,8 +24,8 @@ class Company:
       unMet = platoon.usage()
       platoon.timeStep()
       platoon.placeOrderCheck()
-      FWBInventory.append(platoon.totalInventory()[0])
-      PlasmaInventory.append(platoon.totalInventory()[1])
+      FWBInventory.append(platoon.FWBinventory.avail())
+      PlasmaInventory.append(platoon.Plasmainventory.avail())
       unMetFWBDemand.append(unMet[0])
       unMetPlasmaDemand.append(unMet[1])
     return [unMetFWBDemand, unMetPlasmaDemand, FWBInventory, PlasmaInventory]
@@ -0,0 +1,101 @@
+import numpy as np
+from DemandScenario import generateScenario
+from DemandModels import splitDemand
+from QRPlatoon import FRESH_AGE
+
+def evaluatePolicies(policies, T, l, I, CLMatrix, seed=None, scenario=None, replication=0, chunk=1024, demandModel=None):
+    """ Scores K (R, Q) policies for any number of platoons in one vectorised pass.
+        All policies are simulated against the same demand draws, with the policy as the leading array axis, and each
+        gets the normalised score QRSimulation.sim computes. On the same scenario replication the scores equal those
+        of sim.
+        Args :
+        policies - array (K, 4 * n) of policy vectors laid out as sim's inputs, [R_FWB, Q_FWB, R_Plasma, Q_Plasma] per platoon
+        T - number of days simulated
+        l - list of length n of the locations of each platoon
+        I - list of length n of the initial inventory of each platoon as [Days until Expired, Type of blood, number of units]
+        CLMatrix - list of length n of the combat level probabilities of each platoon
+        seed - seed for the demand draws when no scenario is given
+        scenario, replication - DemandScenario and the replication of it to use as demand draws
+        chunk - number of policies simulated together, bounding memory use
+        demandModel - DemandModels model or registered name the demand is drawn from when no scenario is given, as
+                      passed to sim
+        Returns :
+        array (K,) of scores
+    """
+    n = len(l)
+    policies = np.asarray(policies, dtype=float).reshape(-1, n, 2, 2)
+    if scenario is None:
+        scenario = generateScenario(1, T, CLMatrix, seed=seed, demandModel=demandModel)
+        replication = 0
+    # platoon usage on day t is driven by the combat level drawn the day before
+    TransfusionsDemand = np.asarray(scenario.transfusionDemand[replication, :T, :n], dtype=float)
+    FWBDemand, plasmaDemand = splitDemand(TransfusionsDemand)
+    demand = [np.rint(FWBDemand), np.rint(plasmaDemand)]
+
+    initial = []
+    for p, product in enumerate(['FWB', 'Plasma']):
+        lots = [[(max(item[0], 1), item[2]) for item in I[i] if item[1] == product] for i in range(n)]
+        initial.append(lots)
+    scores = [_simulateChunk(policies[k:k + chunk], T, np.asarray(l), initial, demand) for k in range(0, len(policies), chunk)]
+    return np.concatenate(scores) if len(scores) > 0 else np.zeros(0)
+
+
+def _simulateChunk(policies, T, l, initial, demand):
+    """ Simulates a chunk of policies (K, n, 2, 2) and returns their scores """
+    K, n = policies.shape[:2]
+    rawScore = np.zeros(K)
+    maxUnmet = np.zeros(K)
+    stock = []
+    horizon = []
+    onHand = np.zeros((K, n, 2))
+    for p in range(2):
+        maxAge = max([FRESH_AGE[p]] + [exp for lots in initial[p] for exp, qty in lots])
+        D = T + maxAge + 2
+        s = np.zeros((K, n, D))
+        for i, lots in enumerate(initial[p]):
+            for exp, qty in lots:
+                s[:, i, exp] += qty
+                onHand[:, i, p] += qty
+        stock.append(s)
+        horizon.append(maxAge + 1)
+    outstanding = np.zeros((K, n, 2), dtype=bool)
+    countDown = np.zeros((K, n, 2), dtype=np.int64)
+    R = policies[:, :, :, 0]
+    Q = policies[:, :, :, 1]
+
+    for day in range(1, T + 1):
+        for p in range(2):
+            # lots expiring on day e sit in column e, the ones still usable today are columns day onwards
+            s = stock[p]
+            need = demand[p][day - 1]
+            if need.any():
+                before = onHand[:, :, p].copy()
+                unMet = np.maximum(need - before, 0)
+                onHand[:, :, p] -= need - unMet
+                rawScore += unMet.sum(axis=1)
+                maxUnmet = np.maximum(maxUnmet, unMet.max(axis=1))
+                # FEFO issue only touches the earliest columns, so widen the window until it covers the demand
+                width = 8
+                while True:
+                    live = s[:, :, day:day + min(width, horizon[p])]
+                    cum = np.cumsum(live, axis=-1)
+                    if width >= horizon[p] or (cum[:, :, -1] >= np.minimum(need, before)).all():
+                        break
+                    width *= 4
+                live[...] = np.minimum(live, np.maximum(cum - need[:, None], 0))
+            onHand[:, :, p] -= s[:, :, day]
+            s[:, :, day] = 0
+
+            arriving = outstanding[:, :, p] & (countDown[:, :, p] == 0)
+            rows, cols = np.nonzero(arriving)
+            s[rows, cols, day + FRESH_AGE[p]] += Q[rows, cols, p]
+            onHand[rows, cols, p] += Q[rows, cols, p]
+            outstanding[:, :, p] &= ~arriving
+            countDown[:, :, p] -= outstanding[:, :, p]
+
+        placing = (onHand < R) & ~outstanding
+        outstanding |= placing
+        countDown = np.where(placing, l[:, None], countDown)
+
+    k = 10
+    return (rawScore + maxUnmet * k) / (n * T)
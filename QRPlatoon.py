@@ -1,17 +1,31 @@
+from bisect import bisect_left
 import numpy as np
-from BloodInventoryUnit import BloodInventoryUnit
+from BloodProductStorage import BloodProductStorage
+from DemandModels import getModel, splitDemand
+
+FRESH_AGE = [30, 300] #days until expiry of FWB and Plasma delivered by an order
 
 #Object representing a medical platoon
 class Platoon:
-  def __init__(self, loc, FWBinventory, Plasmainventory, cl, QR):
+  def __init__(self, loc, FWBinventory: BloodProductStorage, Plasmainventory: BloodProductStorage, cl, QR, rng=None, scenario=None, demandModel=None):
     self.location = loc #time to deliver to platoon in days
-    self.FWBinventoryArray = FWBinventory # array of BloodInventoryUnit objects with the productType 'FWB' available to the platoon
-    self.PlasmainventoryArray = Plasmainventory # array of BloodInventoryUnit objects with the productType 'Plasma' available to the platoon
-    self.combatLevelList = cl #list of combat level probabilities, must sum to 1
-    p = np.random.random()
-    cumulative_cl = np.cumsum(cl)
-    self.combatLevel = np.searchsorted(cumulative_cl, p) #The combat level on the current day sampled fro
-    self.OrderPlacement = [[], []] #[[Days until order arrives] entry for each order empty if no orders, BloodInventoryUnit order]
+    self.FWBinventory = FWBinventory # BloodProductStorage of the Fresh Whole Blood available to the platoon, its day counts the platoon's timesteps
+    self.Plasmainventory = Plasmainventory # BloodProductStorage of the Plasma available to the platoon
+    self.combatLevelList = cl #list of combat level probabilities, must sum to 1, or a CombatSchedule schedule
+    self.rng = np.random if rng is None else rng #numpy Generator the platoon draws from, the global np.random state when none is given
+    self.scenario = scenario #PlatoonScenario of pre-drawn combat levels and demand used instead of rng
+    self.draw = 0 #index of the scenario draw or schedule day currently in effect
+    self.demandModel = getModel(demandModel) #DemandModels model the demand is drawn from when there is no scenario
+    self.schedule = cl if hasattr(cl, 'draw') else None #CombatSchedule schedule drawing the combat level of each day
+    self.cumulativeCL = None if self.schedule is not None else np.cumsum(cl).tolist() #searched with bisect, which is cheaper than np.searchsorted on one value
+    if scenario is None and self.schedule is not None:
+      self.combatLevel = self.schedule.draw(0, None, self.rng)
+    elif scenario is None:
+      p = self.rng.random()
+      self.combatLevel = bisect_left(self.cumulativeCL, p) #The combat level on the current day sampled fro
+    else:
+      self.combatLevel = scenario.combatLevels[0]
+    self.outstanding = [0, 0] #ledger of the day the outstanding [FWB, Plasma] order arrives, no order is outstanding once the day is reached
     self.R_FWB = QR[0][0]
     self.Q_FWB = QR[0][1]
     self.R_Plasma = QR[1][0]
@@ -19,49 +33,33 @@ class Platoon:
 
   # function that updates the combat level based on combatLevelList for each new day
   def updateCombatLevel(self):
-    p = np.random.random()
-    cumulative_cl = np.cumsum(self.combatLevelList)
-    self.combatLevel = np.searchsorted(cumulative_cl, p)
+    if self.scenario is not None:
+      self.draw += 1
+      self.combatLevel = self.scenario.combatLevels[self.draw]
+      return
+    if self.schedule is not None:
+      self.draw += 1
+      self.combatLevel = self.schedule.draw(self.draw, self.combatLevel, self.rng)
+      return
+    p = self.rng.random()
+    self.combatLevel = bisect_left(self.cumulativeCL, p)
 
   # function that represents a day passing for the simulation. Updates the combat level, inentory, and order shipments
   def timeStep(self):
      self.updateCombatLevel()
-     for unit in self.FWBinventoryArray:
-      unit.hold()
-     for unit in self.PlasmainventoryArray:
-       unit.hold()
-     self.FWBinventoryArray = [item for item in self.FWBinventoryArray if item.ageUsable > 0]
-     self.PlasmainventoryArray = [item for item in self.PlasmainventoryArray if item.ageUsable > 0]
-     popIndex = []
-     for i in range(len(self.OrderPlacement[0])):
-      if self.OrderPlacement[0][i] == 0:
-        self.addInventory(self.OrderPlacement[1][i])
-        popIndex.append(i)
-      else:
-        self.OrderPlacement[0][i] -= 1
-     numPops = 0
-     for i in popIndex:
-      self.OrderPlacement[0].pop(i - numPops)
-      self.OrderPlacement[1].pop(i - numPops)
-      numPops += 1
+     self.FWBinventory.timestep()
+     self.Plasmainventory.timestep()
 
-  # function that takes a BloodInventoryUnit object as input and adds that object to the correct inventory array for the platoon.
-  # returns an error if the BloodInventoryUnit productType is not stored by the platoon
-  def addInventory(self, order: BloodInventoryUnit):
-    if order.productType == 'FWB':
-       for i in range(len(self.FWBinventoryArray)):
-         if order.ageUsable < self.FWBinventoryArray[i].ageUsable:
-           self.FWBinventoryArray.insert(i, order)
-           return
-       self.FWBinventoryArray.append(order)
-       return
-    if order.productType == 'Plasma':
-      for i in range(len(self.PlasmainventoryArray)):
-       if order.ageUsable < self.PlasmainventoryArray[i].ageUsable:
-          self.PlasmainventoryArray.insert(i, order)
-          return
-      self.PlasmainventoryArray.append(order)
+  # function that adds units of a product to the platoon's inventory, arriving in arrival days, 0 for now
+  # returns an error if the productType is not stored by the platoon
+  def addInventory(self, productType: str, quantity, expires, arrival=0):
+    if productType == 'FWB':
+      self.FWBinventory.add(quantity, expires, arrival)
+      return
+    if productType == 'Plasma':
+      self.Plasmainventory.add(quantity, expires, arrival)
       return
+    raise ValueError('product ' + str(productType) + ' is not stored by the platoon')
 
   #function that goes through the usage of blood for the platoon for a day of simulation. It must be run with time step for every simulated day
   #return the unmet demand for that day as a list with values for FWB and Plasma. If all demand is met the value is 0.
@@ -69,83 +67,27 @@ class Platoon:
     FWBDemand, PlasmaDemand = PlatoonDemand(self)
     FWBDemand = round(FWBDemand)
     PlasmaDemand = round(PlasmaDemand)
-    unMet = [0, 0]
-
-    # Process FWB Demand
-    totalFWB = sum(unit.quantity for unit in self.FWBinventoryArray)
-    if FWBDemand > totalFWB:
-        unMet[0] = FWBDemand - totalFWB
-        self.FWBinventoryArray.clear()
-    else:
-        remaining_demand = FWBDemand
-        new_inventory = []
-        for unit in self.FWBinventoryArray:
-            if remaining_demand > 0:
-                if unit.quantity > remaining_demand:
-                    unit.quantity -= remaining_demand
-                    new_inventory.append(unit)
-                    remaining_demand = 0
-                else:
-                    remaining_demand -= unit.quantity
-            else:
-                new_inventory.append(unit)
-        self.FWBinventoryArray = new_inventory
-
-    # Process Plasma Demand (Similar Logic)
-    totalPlasma = sum(unit.quantity for unit in self.PlasmainventoryArray)
-    if PlasmaDemand > totalPlasma:
-        unMet[1] = PlasmaDemand - totalPlasma
-        self.PlasmainventoryArray.clear()
-    else:
-        remaining_demand = PlasmaDemand
-        new_inventory = []
-        for unit in self.PlasmainventoryArray:
-            if remaining_demand > 0:
-                if unit.quantity > remaining_demand:
-                    unit.quantity -= remaining_demand
-                    new_inventory.append(unit)
-                    remaining_demand = 0
-                else:
-                    remaining_demand -= unit.quantity
-            else:
-                new_inventory.append(unit)
-        self.PlasmainventoryArray = new_inventory
-
-    return unMet
+    # lots are issued first expired first out, demand beyond the units on hand empties the inventory and is unmet
+    return [self.FWBinventory.use(FWBDemand), self.Plasmainventory.use(PlasmaDemand)]
 
 
   #computes the total inventory available for the platoon. returns the inventory in FWB and Palsma as a list.
   def totalInventory(self):
-    FWB = 0
-    Plasma = 0
-    for i in self.FWBinventoryArray:
-      FWB += i.quantity
-    for i in self.PlasmainventoryArray:
-      Plasma += i.quantity
-    return [FWB, Plasma]
+    return [self.FWBinventory.avail(), self.Plasmainventory.avail()]
 
   # function that determines if an order needs to be places by determining if the current inventory is below the given threshold.
-  # If an order is needed the order placement variable is updated to place this order
+  # If an order is needed it is shipped, arriving after location days and held fresh until it does
   def placeOrderCheck(self):
-    if self.totalInventory()[0] < self.R_FWB:
-      orderIn = False
-      for i in self.OrderPlacement[1]:
-        if i.productType == 'FWB':
-          orderIn = True
-      if not orderIn:
-        self.OrderPlacement[0].append(self.location)
-        self.OrderPlacement[1].append(BloodInventoryUnit(30, 'FWB', self.Q_FWB))
-    if self.totalInventory()[1] < self.R_Plasma:
-      orderIn = False
-      for i in self.OrderPlacement[1]:
-        if i.productType == 'Plasma':
-          orderIn = True
-      if not orderIn:
-        self.OrderPlacement[0].append(self.location)
-        self.OrderPlacement[1].append(BloodInventoryUnit(300, 'Plasma', self.Q_Plasma))
+    day = self.FWBinventory.day
+    if self.FWBinventory.avail() < self.R_FWB and self.outstanding[0] <= day:
+      self.outstanding[0] = day + self.location + 1
+      self.FWBinventory.add(self.Q_FWB, self.location + 1 + FRESH_AGE[0], self.location + 1)
+    if self.Plasmainventory.avail() < self.R_Plasma and self.outstanding[1] <= day:
+      self.outstanding[1] = day + self.location + 1
+      self.Plasmainventory.add(self.Q_Plasma, self.location + 1 + FRESH_AGE[1], self.location + 1)
 
   def print(self):
-    return 'Location: ' + str(self.location) + ' FWB Inventory: ' + str(self.FWBinventoryArray) + ' Plasma Inventory: ' + str(self.PlasmainventoryArray) + ' Combat Level: ' + str(self.combatLevel) + ' Order Placement: ' + str(self.OrderPlacement)
+    return 'Location: ' + str(self.location) + ' FWB Inventory: ' + str(self.FWBinventory) + ' Plasma Inventory: ' + str(self.Plasmainventory) + ' Combat Level: ' + str(self.combatLevel) + ' Outstanding Orders: ' + str(self.outstanding)
 
 
 
@@ -155,7 +97,7 @@ class Platoon:
 # Output the Whole blood/red blood cell demand, plamsa demand
 ##
 def PlatoonDemand(platoon):
-  numCasualities =  max(0,np.random.normal(platoon.combatLevel,platoon.combatLevel*0.5))
-  TransfusionsDemand = numCasualities * 0.2 * np.random.exponential(0.1116)*4815
-  plasmaDemand = TransfusionsDemand * 0.02
-  return TransfusionsDemand - plasmaDemand, plasmaDemand
+  if platoon.scenario is not None:
+    return splitDemand(platoon.scenario.transfusionDemand[platoon.draw])
+  numCasualities, TransfusionsDemand = platoon.demandModel.sampleOne(platoon.combatLevel, platoon.rng)
+  return splitDemand(TransfusionsDemand)
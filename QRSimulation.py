@@ -1,8 +1,13 @@
+import os
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 import numpy as np
-from BloodInventoryUnit import BloodInventoryUnit
+from BloodProductStorage import BloodProductStorage
 from QRPlatoon import Platoon
 from QRCompany import Company
-from skopt import gp_minimize
+from RandomStreams import spawnGenerators, spawnSeeds
+from EvaluationCache import CachedObjective, CachedSimulation, digest
+from PolicyRacing import RacingObjective
 
 T = 100 #Number of days simulated
 n = 2 #Number of Platoons
@@ -14,43 +19,150 @@ QR = [[[400, 1800], [5, 30]], [[500, 1000], [5, 20]]] # List of length n with an
 #blood category of the form [R, Q]. Q + R must be less than the platoon's storage capacity.
 SC = [2500, 2000] #list of length n of the storage capacity in units for each platoon
 
-def sim(inputs):
-  simQR = [[[inputs[0], inputs[1]], [inputs[2], inputs[3]]], [[inputs[4], inputs[5]], [inputs[6], inputs[7]]]]
-  platoons = []
-  for i in range(n):
-    FWBInv = []
-    PlasmaInv = []
-    for j in I[i]:
-      if j[1] == 'FWB':
-       FWBInv.append(BloodInventoryUnit(j[0], j[1], j[2]))
-      if j[1] == 'Plasma':
-        PlasmaInv.append(BloodInventoryUnit(j[0], j[1], j[2]))
-    platoons.append(Platoon(l[i], FWBInv, PlasmaInv, CLMatrix[i], simQR[i]))
-
-  Company1 = Company([], [], [], platoons)
-  result = []
-  for i in range(T):
-    output = Company1.timeStep()
-    result.append(output)
+def sim(inputs, seed=None, scenario=None, replication=0, demandModel=None, start=None):
+  #seed - integer or SeedSequence giving every platoon its own Generator, the global np.random state is used when None
+  #scenario, replication - DemandScenario and the replication of it to consume instead of drawing random numbers
+  #demandModel - DemandModels model or registered name the platoons draw demand from, the parametric model when None
+  #start - Snapshot.snapshot of a warmed-up company to continue from instead of building one, the policy inputs are
+  #        applied to its platoons and only the days after the snapshot are simulated and scored; with a seed the
+  #        platoons draw from fresh streams, otherwise from the random state saved in the snapshot
+  if start is None:
+    Company1 = buildCompany(inputs, seed, scenario, replication, demandModel)
+    day = 0
+  else:
+    from Snapshot import restore, reseed
+    Company1, day = restore(start)
+    if day >= T:
+      raise ValueError(f'the snapshot is at day {day}, which leaves none of the T = {T} days to simulate')
+    setPolicy(Company1, inputs)
+    if seed is not None:
+      reseed(Company1, seed)
+  unMet = runCompany(Company1, T - day)
 
-  result = np.array(result).T
   k = 10
-  rawScore = 0
-  maxUnmet = 0
-  for i in result:
-    rawScore += sum(i[0]) + sum(i[1])
-    for j in i[0]:
-      if j > maxUnmet:
-        maxUnmet = j
-    for j in i[1]:
-      if j > maxUnmet:
-        maxUnmet = j
+  rawScore = unMet.sum()
+  maxUnmet = max(unMet.max(initial=0), 0)
   rawScore += maxUnmet * k
-  normalizeScore = rawScore / (n*T)
+  normalizeScore = rawScore / (n*len(unMet))
   return normalizeScore
 
-def QRsim():
-    bounds = [(200, 800), (500, 2000), (0, 15), (10, 50), (200, 800), (500, 2000), (0, 15), (10, 50)]
+def policies(inputs):
+  """ Returns the policy vector of sim as a list of length n of [[R, Q] of FWB, [R, Q] of Plasma] """
+  return [[[inputs[4*i], inputs[4*i+1]], [inputs[4*i+2], inputs[4*i+3]]] for i in range(n)]
+
+def buildCompany(inputs, seed=None, scenario=None, replication=0, demandModel=None):
+  #builds the company and platoons of a sim run in their state before day 1, the arguments are those of sim
+  simQR = policies(inputs)
+  rngs = spawnGenerators(seed, n)
+  platoons = []
+  for i in range(n):
+    FWBInv = BloodProductStorage([(j[2], j[0], 0) for j in I[i] if j[1] == 'FWB'])
+    PlasmaInv = BloodProductStorage([(j[2], j[0], 0) for j in I[i] if j[1] == 'Plasma'])
+    platoons.append(Platoon(l[i], FWBInv, PlasmaInv, CLMatrix[i], simQR[i], rngs[i],
+                             None if scenario is None else scenario.platoon(replication, i), demandModel))
+  return Company(BloodProductStorage([]), BloodProductStorage([]), [], platoons)
+
+def runCompany(Company1, days):
+  #runs a built company for days days and returns the integer array (days, 2, n) of its unmet FWB and Plasma demand
+  unMet = np.zeros((days, 2, len(Company1.platoonList)), dtype=np.int64)
+  for i in range(days):
+    output = Company1.timeStep()
+    unMet[i] = output[:2]
+  return unMet
 
-    result = gp_minimize(sim, bounds, n_calls=100)
+def setPolicy(Company1, inputs):
+  """ Sets the R and Q values of every platoon of a company to those of a policy vector of sim """
+  for platoon, QR in zip(Company1.platoonList, policies(inputs)):
+    platoon.R_FWB, platoon.Q_FWB = QR[0]
+    platoon.R_Plasma, platoon.Q_Plasma = QR[1]
+
+bounds = [(200, 800), (500, 2000), (0, 15), (10, 50), (200, 800), (500, 2000), (0, 15), (10, 50)]
+
+def simContext(scenario=None, replication=0):
+    """ Returns the EvaluationCache context of sim, identifying the model inputs or the scenario replication consumed """
+    if scenario is not None:
+        return digest('QR', l, I, scenario.digest(), replication)
+    return digest('QR', l, I, CLMatrix)
+
+def QRsim(objective=sim, cache=None, seed=None):
+    #objective - function scoring a policy vector, sim or a PolicyRacing.RacingObjective around sim
+    #cache - EvaluationCache consulted before simulating. With sim the search is warm-started from the points it already
+    #        holds, with a RacingObjective its replications are cached, as racing scores depend on the incumbent history
+    #seed - seed every evaluation of sim runs with, required when a cache is given; a RacingObjective uses its own seeds
+    if seed is not None and isinstance(objective, RacingObjective):
+        raise ValueError('a RacingObjective runs with the seeds spawned from its own seed, pass it to the RacingObjective')
+    from skopt import gp_minimize #skopt loads scikit-learn and scipy, so it is only imported when a search runs
+    x0 = None
+    y0 = None
+    if cache is None and seed is not None:
+        objective = partial(objective, seed=seed)
+    elif cache is not None and isinstance(objective, RacingObjective):
+        if objective.seed is None:
+            raise ValueError('a RacingObjective needs a seed to cache its replications')
+        objective.simulate = CachedSimulation(objective.simulate, cache, simContext(), T)
+    elif cache is not None:
+        if objective is not sim:
+            raise ValueError('only sim and RacingObjective evaluations can be cached')
+        objective = CachedObjective(objective, cache, simContext(), T, seed)
+        x0, y0 = objective.points(bounds)
+    result = gp_minimize(objective, bounds, n_calls=100, x0=x0 or None, y0=y0 or None)
     print(f"Best configuration: {result.x} with score: {result.fun}")
+
+def QRsimParallel(workers=None, n_calls=100, seed=None, strategy='cl_min', cache=None):
+    """ Parallel version of QRsim that keeps a pool of workers busy with an ask/tell loop.
+        A first batch of candidates is proposed with the constant liar strategy, and whenever an evaluation finishes
+        its score is told to the optimiser and a replacement is proposed with the points still running treated as lies.
+        Args :
+        workers - number of worker processes, None uses every core
+        n_calls - total number of simulations
+        seed - seed for the optimiser and the simulations, evaluation k always runs with the k-th spawned seed
+        strategy - constant liar strategy, 'cl_min', 'cl_mean' or 'cl_max'
+        cache - EvaluationCache the optimiser is warm-started from and every score is stored in, requires a seed
+        Returns :
+        OptimizeResult in the form gp_minimize returns
+    """
+    if cache is not None and seed is None:
+        raise ValueError('a seed is needed to cache evaluations')
+    from skopt import Optimizer
+    workers = workers or os.cpu_count()
+    opt = Optimizer(bounds, base_estimator='GP', acq_func='gp_hedge', random_state=seed)
+    seeds = spawnSeeds(seed, n_calls)
+    context = simContext()
+    free = list(range(n_calls))
+    if cache is not None:
+        # evaluation k of an earlier run of the study is cached under the k-th seed, so a resumed study skips it
+        for k in range(n_calls):
+            x0, y0 = cache.points(context, T, seeds[k], bounds)
+            if len(x0) > 0:
+                opt.tell(x0, y0)
+                free.remove(k)
+    pending = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for x in _propose(opt, [], min(workers, len(free)), strategy) if len(free) > 0 else []:
+            k = free.pop(0)
+            pending[pool.submit(sim, x, seeds[k])] = (x, k)
+        while len(pending) > 0:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                x, k = pending.pop(future)
+                opt.tell(x, future.result())
+                if cache is not None:
+                    cache.put(context, x, T, seeds[k], future.result())
+            count = min(len(done), len(free))
+            if count > 0:
+                for x in _propose(opt, [x for x, k in pending.values()], count, strategy):
+                    k = free.pop(0)
+                    pending[pool.submit(sim, x, seeds[k])] = (x, k)
+
+    result = opt.get_result()
+    print(f"Best configuration: {result.x} with score: {result.fun}")
+    return result
+
+def _propose(opt, running, k, strategy):
+    """ Asks opt for k new points while the points in running are still being evaluated """
+    if len(running) == 0 or len(opt.yi) == 0:
+        return opt.ask(n_points=k, strategy=strategy)
+    lie = {'cl_min': np.min, 'cl_mean': np.mean, 'cl_max': np.max}[strategy](opt.yi)
+    liar = opt.copy(random_state=opt.rng)
+    liar.tell(running, [lie] * len(running))
+    return liar.ask(n_points=k, strategy=strategy)
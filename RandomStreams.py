@@ -0,0 +1,19 @@
+import numpy as np
+
+def seedSequence(seed):
+    """ Returns seed as a numpy SeedSequence, accepting an integer, None or an existing SeedSequence """
+    return seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+
+def spawnSeeds(seed, count):
+    """ Spawns count independent child SeedSequences from seed, e.g. one per replication.
+        Unlike SeedSequence.spawn the children depend only on seed and not on how many were spawned from it before,
+        so the same seed always yields the same streams """
+    parent = seedSequence(seed)
+    return [np.random.SeedSequence(parent.entropy, spawn_key=parent.spawn_key + (i,), pool_size=parent.pool_size) for i in range(count)]
+
+def spawnGenerators(seed, count):
+    """ Spawns count independent numpy Generators from seed, e.g. one per platoon.
+        Returns a list of None when seed is None so that callers fall back to the global np.random state """
+    if seed is None:
+        return [None] * count
+    return [np.random.default_rng(s) for s in spawnSeeds(seed, count)]
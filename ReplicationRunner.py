@@ -0,0 +1,46 @@
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import numpy as np
+from RandomStreams import spawnSeeds
+
+def runReplications(fn, R, masterSeed, workers=None, indexed=False):
+    """ Runs R replications of a simulation, spreading them over a process pool.
+        Every replication is called as fn(seed=child) with its own SeedSequence spawned from masterSeed, so results
+        depend only on masterSeed and never on the number of workers or the order replications finish in.
+        Args :
+        fn - picklable callable taking a seed keyword, e.g. a functools.partial of TFSim or QRSimulation.sim
+        R - number of replications
+        masterSeed - integer or SeedSequence the replication seeds are spawned from
+        workers - number of worker processes, None uses every core and 1 runs in this process
+        indexed - also pass the replication number, calling fn(seed=child, replication=j)
+        Returns :
+        list of the R replication results in replication order
+    """
+    seeds = spawnSeeds(masterSeed, R)
+    replications = range(R) if indexed else [None] * R
+    if workers == 1:
+        return [_call(fn, s, j) for s, j in zip(seeds, replications)]
+    workers = workers or os.cpu_count()
+    chunksize = max(1, math.ceil(R / (4 * workers)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_call, [fn] * R, seeds, replications, chunksize=chunksize))
+
+def _call(fn, seed, replication=None):
+    if replication is None:
+        return fn(seed=seed)
+    return fn(seed=seed, replication=replication)
+
+def runTFReplications(R, masterSeed, T, n, l, avgOrderInterval, maxOrderInterval, TargetInv, PI, CI, CLMatrix, workers=None, **kwargs):
+    """ Runs R replications of TFSim in parallel and returns the list of their result DataFrames.
+        Extra keyword arguments, e.g. storage, are passed on to TFSim. With a sink, a ResultWriter for R replications,
+        replication j is streamed into row j of its file and a list of None is returned. """
+    from TransportFeedbackSim import TFSim
+    fn = partial(TFSim, T, n, l, avgOrderInterval, maxOrderInterval, TargetInv, PI, CI, CLMatrix, **kwargs)
+    return runReplications(fn, R, masterSeed, workers, indexed=kwargs.get('sink') is not None)
+
+def runQRReplications(inputs, R, masterSeed, workers=None):
+    """ Runs R replications of QRSimulation.sim for one policy vector in parallel and returns their scores as an array """
+    from QRSimulation import sim
+    return np.array(runReplications(partial(sim, list(inputs)), R, masterSeed, workers))
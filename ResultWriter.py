@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+METRICS = ['TransDays', 'TransSpace', 'FWBUnmet', 'PlasmaUnmet', 'FWBExpired', 'PlasmaExpired']
+
+class ResultWriter:
+  """ Streaming sink for TFSim output that keeps memory bounded regardless of the horizon and number of replications.
+      Daily outputs are appended to an in-memory chunk of chunkDays days, which is flushed into a .npy file of shape
+      (R, T, n + 1, 6) when full. Company.timeStep writes into the row nextRow hands out, as with SimulationResult.
+      Slot n of the third axis holds the company totals and the last axis the metrics in toDF order, so readResults
+      can memory-map the file and resultDF view a replication as a DataFrame without copying.
+      The file is created when the writer is constructed, and a pickled writer reopens it in place, so replications
+      run in worker processes can stream into the same file.
+      Attributes :
+      path - .npy file the results are written to
+      R, T, n - number of replications, days and platoons the file holds
+      chunkDays - number of days buffered before a flush
+      replication - replication the buffered days belong to
+      day - day of the first buffered row
+      filled - number of buffered rows """
+  def __init__(self, path, R, T, n, chunkDays=256):
+    self.path = path
+    self.R = R
+    self.T = T
+    self.n = n
+    self.chunkDays = chunkDays
+    self.results = np.lib.format.open_memmap(path, mode='w+', dtype=np.int64, shape=(R, T, n + 1, 6))
+    self._reset()
+
+  def _reset(self):
+    self.chunk = np.zeros((self.chunkDays, self.n + 1, 6), dtype=np.int64)
+    self.replication = 0
+    self.day = 0
+    self.filled = 0
+
+  def __getstate__(self):
+    state = self.__dict__.copy()
+    state['results'] = None
+    state['chunk'] = None
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self.results = np.load(self.path, mmap_mode='r+')
+    self._reset()
+
+  def nextRow(self, replication=0):
+    """ Returns the writable (n, 6) row of the next day of replication, days are numbered from 0 per replication """
+    if replication != self.replication:
+      self.flush()
+      self.replication = replication
+      self.day = 0
+    if self.filled == self.chunkDays:
+      self.flush()
+    self.filled += 1
+    return self.chunk[self.filled - 1, :self.n]
+
+  def row(self, output, replication=0):
+    """ Appends the output of one Company.timeStep() given as lists per metric """
+    self.nextRow(replication)[:] = np.asarray(output).T
+
+  def flush(self):
+    """ Computes the company totals of the buffered days and writes them to the file """
+    if self.filled > 0:
+      self.chunk[:self.filled, self.n] = self.chunk[:self.filled, :self.n].sum(axis=1)
+      self.results[self.replication, self.day:self.day + self.filled] = self.chunk[:self.filled]
+      self.results.flush()
+      self.day += self.filled
+      self.filled = 0
+
+  def close(self):
+    self.flush()
+    self.results = None
+
+
+def readResults(path, mmap=True):
+  """ Opens a file written by ResultWriter as an array (R, T, n + 1, 6), memory-mapped read-only unless mmap is False """
+  return np.load(path, mmap_mode='r' if mmap else None)
+
+def resultColumns(n):
+  """ Returns the toDF column names of n platoons followed by the company totals """
+  names = ['Platoon' + str(i + 1) for i in range(n)] + ['Company']
+  return [name + '_' + metric for name in names for metric in METRICS]
+
+def resultDF(results, r=0):
+  """ Returns replication r of a ResultWriter array as a DataFrame with the columns of toDF.
+      The DataFrame is a view of the memory-mapped file, adding columns to it leaves the file untouched """
+  T, slots = results.shape[1:3]
+  return pd.DataFrame(results[r].reshape(T, slots * 6), columns=resultColumns(slots - 1), copy=False)
@@ -0,0 +1,118 @@
+import math
+import numpy as np
+
+def distanceMatrix(locations, coordinates):
+    """ Builds the travel-time matrix between the company and its platoons.
+        Node 0 is the company and node i + 1 platoon i. Company legs are the platoons' locations, so a tour visiting a
+        single platoon costs what a dedicated delivery does, and legs between platoons are straight-line distances.
+        Args :
+        locations - list of length n of the locations of each platoon in days at speed 1
+        coordinates - list of length n of (x, y) positions of each platoon in days at speed 1, the company at (0, 0)
+        Returns :
+        array (n + 1, n + 1) of travel times in days at speed 1 """
+    points = np.vstack([[0.0, 0.0], np.asarray(coordinates, dtype=float)])
+    distances = np.sqrt(((points[:, None, :] - points[None, :, :]) ** 2).sum(axis=-1))
+    distances[0, 1:] = locations
+    distances[1:, 0] = locations
+    return distances
+
+def apportion(total, weights):
+    """ Splits an integer total into integer shares proportional to weights by the largest remainder method """
+    weights = np.asarray(weights, dtype=float)
+    if weights.sum() <= 0:
+        weights = np.ones(len(weights))
+    exact = total * weights / weights.sum()
+    shares = np.floor(exact).astype(int)
+    for k in np.argsort(shares - exact)[:total - shares.sum()]:
+        shares[k] += 1
+    return shares.tolist()
+
+
+class Router:
+    """ Batches a day's orders into capacity-feasible multi-stop tours.
+        Tours are built with the Clarke-Wright savings heuristic, merging tours over the pairs of stops that save the
+        most travel time, and each tour is then improved with 2-opt. Only the savings of every stop with its nearest
+        neighbours are considered, so routing stays fast for hundreds of stops a day.
+        Attributes :
+        distances - array (n + 1, n + 1) of travel times in days at speed 1, node 0 the company and node i + 1 platoon i
+        neighbours - number of nearest neighbours of each stop whose savings are considered """
+    def __init__(self, distances, neighbours=10):
+        self.distances = np.asarray(distances, dtype=float)
+        self.neighbours = neighbours
+
+    def route(self, platoons, loads, capacity):
+        """ Groups stops into tours.
+            Args :
+            platoons - list of the platoon index of every stop
+            loads - list of the units loaded for every stop
+            capacity - units a tour can carry
+            Returns :
+            list of tours, each a list of stop positions in visiting order """
+        m = len(platoons)
+        if m <= 1:
+            return [[k] for k in range(m)]
+        nodes = np.asarray(platoons) + 1
+        depot = self.distances[0, nodes]
+        savings = depot[:, None] + depot[None, :] - self.distances[np.ix_(nodes, nodes)]
+        np.fill_diagonal(savings, -np.inf)
+        k = min(self.neighbours, m - 1)
+        nearest = np.argpartition(-savings, k - 1, axis=1)[:, :k]
+        a = np.repeat(np.arange(m), k)
+        b = nearest.ravel()
+        pairs = np.minimum(a, b) * m + np.maximum(a, b)
+        pairs, first = np.unique(pairs, return_index=True)
+        value = savings[a[first], b[first]]
+        order = np.argsort(-value, kind='stable')
+        order = order[value[order] > 0]
+        a = pairs[order] // m
+        b = pairs[order] % m
+
+        tourOf = list(range(m))
+        tours = {k: [k] for k in range(m)}
+        load = {k: loads[k] for k in range(m)}
+        for i, j in zip(a.tolist(), b.tolist()):
+            ti = tourOf[i]
+            tj = tourOf[j]
+            if ti == tj or load[ti] + load[tj] > capacity:
+                continue
+            first = tours[ti]
+            second = tours[tj]
+            # stops can only be joined where they are tour ends
+            if first[-1] != i:
+                if first[0] != i:
+                    continue
+                first.reverse()
+            if second[0] != j:
+                if second[-1] != j:
+                    continue
+                second.reverse()
+            first.extend(second)
+            load[ti] += load.pop(tj)
+            del tours[tj]
+            for s in second:
+                tourOf[s] = ti
+        return [self.twoOpt(tour, nodes) for tour in tours.values()]
+
+    def twoOpt(self, tour, nodes):
+        """ Improves a tour by reversing segments while that shortens it """
+        if len(tour) < 3:
+            return tour
+        # positions 0 and len(tour) + 1 are the company, position p the stop tour[p - 1]
+        path = [0] + [int(nodes[s]) for s in tour] + [0]
+        d = self.distances[np.ix_(path, path)].tolist()
+        order = list(range(len(path)))
+        improved = True
+        while improved:
+            improved = False
+            for i in range(1, len(order) - 2):
+                for j in range(i + 1, len(order) - 1):
+                    a, b, c, e = order[i - 1], order[i], order[j], order[j + 1]
+                    if d[a][c] + d[b][e] < d[a][b] + d[c][e] - 1e-9:
+                        order[i:j + 1] = order[i:j + 1][::-1]
+                        improved = True
+        return [tour[p - 1] for p in order[1:-1]]
+
+    def legDays(self, tour, platoons, speed):
+        """ Returns the days each leg of a tour takes at speed, from the company through every stop and back """
+        path = [0] + [platoons[s] + 1 for s in tour] + [0]
+        return [math.ceil(self.distances[path[k], path[k + 1]] / speed) for k in range(len(path) - 1)]
@@ -0,0 +1,276 @@
+import math
+from functools import lru_cache
+import numpy as np
+from DemandScenario import DemandScenario
+from BloodProductStorage import BloodProductStorage
+from TransportFeedbackSim import TFSim
+from DemandModels import PLASMA_SHARE, getModel
+from QRPlatoon import FRESH_AGE
+
+PARAMETRIC = getModel('parametric') #the demand model the analytical tables describe
+CASUALTY_SCALE = PARAMETRIC.rate * PARAMETRIC.pints #pints of transfusion demand per casuality per unit of the exponential factor
+EXPONENTIAL_MEAN = PARAMETRIC.mean #mean of the exponential transfusion factor
+PRODUCTS = ['FWB', 'Plasma']
+
+def _share(product):
+    return 1 - PLASMA_SHARE if PRODUCTS.index(product) == 0 else PLASMA_SHARE
+
+def _transfusionTail(level, x, grid):
+    """ Returns P(transfusion demand > x) at a combat level for an array of x, integrating the exponential tail over
+        the truncated normal casuality count with the midpoint rule """
+    if level <= 0:
+        return np.zeros(len(x))
+    sigma = level * PARAMETRIC.spread
+    # casualities are max(0, N(level, level * spread)), the tail only comes from the positive part
+    c = np.linspace(0, level + 8 * sigma, grid + 1)
+    c = (c[1:] + c[:-1]) / 2
+    w = np.exp(-0.5 * ((c - level) / sigma) ** 2) / (sigma * math.sqrt(2 * math.pi)) * (c[1] - c[0])
+    w *= 0.5 * (1 + math.erf(1 / (PARAMETRIC.spread * math.sqrt(2)))) / w.sum()
+    scale = CASUALTY_SCALE * EXPONENTIAL_MEAN * c
+    return np.exp(-np.asarray(x, dtype=float)[:, None] / scale[None, :]) @ w
+
+@lru_cache(maxsize=None)
+def _levelPMF(level, product, tol, grid):
+    share = _share(product)
+    # find the unit count beyond which less than tol of the mass lies
+    top = 1
+    while _transfusionTail(level, [(top + 0.5) / share], grid)[0] > tol:
+        top *= 2
+    edges = (np.arange(top + 1) + 0.5) / share
+    cdf = 1 - _transfusionTail(level, edges, grid)
+    pmf = np.diff(np.concatenate([[0.0], cdf]))
+    pmf[-1] += 1 - pmf.sum()
+    pmf.setflags(write=False)
+    return pmf
+
+def levelPMF(level, product, tol=1e-9, grid=500):
+    """ Tabulates the daily demand of one product at one combat level as PlatoonDemand draws and Platoon.usage rounds it.
+        Args :
+        level - combat level
+        product - 'FWB' or 'Plasma'
+        tol - probability mass beyond the last unit count, folded into the last entry
+        grid - number of points the casuality count is integrated over
+        Returns :
+        read-only array, entry d the probability of demanding d units """
+    return _levelPMF(int(level), product, tol, grid)
+
+def levelProbabilities(cl):
+    """ Returns the probability of every combat level a platoon draws. Levels are drawn by searching the cumulative
+        probabilities, so when cl sums to less than 1 the rest falls on level len(cl) """
+    cl = [float(p) for p in cl]
+    rest = 1 - sum(cl)
+    return cl + [rest] if rest > 1e-12 else cl
+
+def dailyPMF(cl, product, tol=1e-9):
+    """ Returns the pmf of a platoon's daily demand of a product, the mixture of the level pmfs weighted by the combat
+        level probabilities cl """
+    cl = levelProbabilities(cl)
+    pmfs = [levelPMF(level, product, tol) for level in range(len(cl))]
+    pmf = np.zeros(max(len(p) for p in pmfs))
+    for p, weight in zip(pmfs, cl):
+        pmf[:len(p)] += weight * p
+    return pmf
+
+@lru_cache(maxsize=256)
+def _demandOver(cl, product, days, tol):
+    pmf = convolvePower(dailyPMF(cl, product, tol), days, tol)
+    G = lossFunction(pmf)
+    pmf.setflags(write=False)
+    G.setflags(write=False)
+    return pmf, G
+
+def demandOver(cl, product, days, tol=1e-9):
+    """ Returns the pmf of a platoon's total demand of a product over days days, cached for repeated screening """
+    return _demandOver(tuple(float(p) for p in cl), product, int(days), tol)[0]
+
+def _tables(cl, product, days, tol):
+    return _demandOver(tuple(float(p) for p in cl), product, int(days), tol)
+
+def convolvePower(pmf, k, tol=1e-9):
+    """ Returns the pmf of the sum of k independent draws of pmf, computed with one FFT and cut where less than tol of
+        the mass remains """
+    if k <= 0:
+        return np.ones(1)
+    size = k * (len(pmf) - 1) + 1
+    fft = 1 << (size - 1).bit_length()
+    result = np.fft.irfft(np.fft.rfft(pmf, fft) ** k, fft)[:size]
+    result = np.maximum(result, 0)
+    result /= result.sum()
+    tail = np.cumsum(result[::-1])[::-1]
+    return result[:max(1, np.searchsorted(-tail, -tol))]
+
+def lossFunction(pmf):
+    """ Returns G with G[r] = E[(D - r)^+] for r = 0 .. len(pmf), the expected demand beyond r units """
+    d = np.arange(len(pmf))
+    tailMass = np.concatenate([np.cumsum(pmf[::-1])[::-1], [0.0]])
+    tailMoment = np.concatenate([np.cumsum((d * pmf)[::-1])[::-1], [0.0]])
+    r = np.arange(len(pmf) + 1)
+    return np.maximum(tailMoment - r * tailMass, 0)
+
+def expectedShortage(pmf, r, G=None):
+    """ Returns E[(D - r)^+] for an array of stock levels r, interpolating linearly between whole units """
+    G = lossFunction(pmf) if G is None else G
+    r = np.clip(np.asarray(r, dtype=float), 0, len(G) - 1)
+    return np.interp(r, np.arange(len(G)), G)
+
+def expectedLeftover(pmf, y, G=None):
+    """ Returns E[(y - D)^+] for an array of stock levels y """
+    y = np.maximum(np.asarray(y, dtype=float), 0)
+    mean = float(np.arange(len(pmf)) @ pmf)
+    G = lossFunction(pmf) if G is None else G
+    beyond = np.where(y > len(G) - 1, 0, expectedShortage(pmf, y, G))
+    return y - mean + beyond
+
+def targetLevelMetrics(cl, product, target, interval, lead, shelfLife=None, tol=1e-9):
+    """ Approximates the steady state of a transport feedback platoon that orders up to a target every interval days.
+        The stock after an order arrives has to last interval days, and an order placed on day t is usable from day
+        t + lead, so a cycle is short of what demand over interval + lead - 1 days exceeds the target by. A unit
+        expires when the demand over its shelf life falls short of the stock held.
+        Args :
+        cl - combat level probabilities of the platoon
+        product - 'FWB' or 'Plasma'
+        target - array of target inventory levels
+        interval - days between orders
+        lead - days from an order to its arrival
+        shelfLife - days a delivered unit lasts, FRESH_AGE of the product when None
+        Returns :
+        dictionary of arrays 'shortage' and 'expiry' in units per day and 'fill' the share of demand met """
+    shelfLife = FRESH_AGE[PRODUCTS.index(product)] if shelfLife is None else shelfLife
+    daily, G = _tables(cl, product, 1, tol)
+    mean = float(np.arange(len(daily)) @ daily)
+    target = np.asarray(target, dtype=float)
+    cycleDemand, G = _tables(cl, product, interval + max(lead, 1) - 1, tol)
+    shortage = expectedShortage(cycleDemand, target, G) / interval
+    lifeDemand, G = _tables(cl, product, shelfLife, tol)
+    expiry = expectedLeftover(lifeDemand, target, G) / shelfLife
+    fill = 1 - shortage / mean if mean > 0 else np.ones_like(shortage)
+    return {'shortage': shortage, 'expiry': expiry, 'fill': fill}
+
+def _convolveBelow(f, weights):
+    """ Returns h with h[s] = sum_j weights[j] f[max(s - j, 0)] for s = 0 .. len(f) - 1, computed with one FFT """
+    x = np.concatenate([np.full(len(weights) - 1, f[0]), f])
+    fft = 1 << (len(x) + len(weights) - 2).bit_length()
+    full = np.fft.irfft(np.fft.rfft(x, fft) * np.fft.rfft(weights, fft), fft)
+    return full[len(weights) - 1:len(weights) - 1 + len(f)]
+
+@lru_cache(maxsize=256)
+def _reorderTables(cl, product, lead, tol):
+    daily = _demandOver(cl, product, 1, tol)[0]
+    leadDemand, G = _demandOver(cl, product, lead + 1, tol)
+    # stock falls below R on a day with positive demand, and by the renewal theorem the units it ends up below R - 1
+    # follow the excess distribution of the positive daily demand
+    positive = daily[1:]
+    if positive.sum() > 0:
+        tail = np.cumsum(positive[::-1])[::-1]
+        excess = tail / tail.sum()
+    else:
+        excess = np.ones(1)
+    left = expectedLeftover(leadDemand, np.arange(len(G)), G)
+    # entry s of each table is for R - 1 = s: the units short on the day stock falls below R, the units short over the
+    # lead time after it and the units left when the order arrives
+    tables = (lossFunction(excess), _convolveBelow(G, excess), _convolveBelow(left, excess))
+    for table in tables:
+        table.setflags(write=False)
+    return tables
+
+def rqMetrics(cl, product, R, Q, lead, shelfLife=None, tol=1e-9):
+    """ Approximates the steady state of a QR platoon that orders Q units when its stock falls below R, with at most one
+        order outstanding and demand beyond the stock on hand lost.
+        A cycle runs from one arrival to the next. Stock is used until a day's demand takes it below R, landing
+        below R - 1 by the excess of the daily demand, and the order placed that day is usable lead + 1 days later, so
+        a cycle is short of what the crossing day and the lead time demand beyond the stock. The lot arriving expires
+        in part when the demand over its shelf life falls short of it and the stock left, and a cycle lasts as long as
+        demand takes to use the lot, at least the lead time.
+        Args :
+        cl - combat level probabilities of the platoon
+        product - 'FWB' or 'Plasma'
+        R, Q - arrays of reorder points and order quantities
+        lead - location of the platoon in days
+        shelfLife - days a delivered unit lasts, FRESH_AGE of the product when None
+        Returns :
+        dictionary of arrays 'shortage' and 'expiry' in units per day and 'fill' the share of demand met """
+    shelfLife = FRESH_AGE[PRODUCTS.index(product)] if shelfLife is None else shelfLife
+    daily, G = _tables(cl, product, 1, tol)
+    mean = float(np.arange(len(daily)) @ daily)
+    R = np.asarray(R, dtype=float)
+    Q = np.asarray(Q, dtype=float)
+    crossing, leadShortage, leadLeft = _reorderTables(tuple(float(p) for p in cl), product, int(lead), tol)
+    s = R - 1
+    perCycle = expectedShortage(None, s, crossing) + _lookup(leadShortage, s)
+    left = _lookup(leadLeft, s, extend=True)
+    lifeDemand, G = _tables(cl, product, shelfLife, tol)
+    expired = np.minimum(expectedLeftover(lifeDemand, left + Q, G), Q)
+    cycle = np.maximum(lead + 1, (Q - expired + perCycle) / mean) if mean > 0 else np.full_like(Q, np.inf)
+    shortage = perCycle / cycle
+    expiry = expired / cycle
+    # a platoon with R = 0 never orders and eventually loses all demand
+    never = R <= 0
+    shortage = np.where(never, mean, shortage)
+    expiry = np.where(never, 0, expiry)
+    fill = 1 - shortage / mean if mean > 0 else np.ones_like(shortage)
+    return {'shortage': shortage, 'expiry': expiry, 'fill': fill}
+
+def _lookup(table, s, extend=False):
+    """ Interpolates table at stock levels s, past its end a table is constant or, with extend, grows by one per unit """
+    s = np.maximum(np.asarray(s, dtype=float), 0)
+    value = np.interp(s, np.arange(len(table)), table)
+    if extend:
+        value = value + np.maximum(s - (len(table) - 1), 0)
+    return value
+
+def screenPolicies(policies, l, CLMatrix, tol=1e-9):
+    """ Scores QR policies analytically in the layout QRSimulation.sim takes them.
+        The score is the expected unmet demand per platoon-day, sim's score without its penalty on the worst day, so it
+        ranks policies the way sim's first term does at a small fraction of its cost.
+        Args :
+        policies - array (K, 4 * n) of policy vectors, [R_FWB, Q_FWB, R_Plasma, Q_Plasma] per platoon
+        l - list of length n of the locations of each platoon
+        CLMatrix - list of length n of the combat level probabilities of each platoon
+        Returns :
+        dictionary of 'score', array (K,), and 'shortage', 'expiry' and 'fill', arrays (K, n, 2) per platoon and product """
+    n = len(l)
+    policies = np.asarray(policies, dtype=float).reshape(-1, n, 2, 2)
+    metrics = {name: np.zeros(policies.shape[:3]) for name in ['shortage', 'expiry', 'fill']}
+    for i in range(n):
+        for p, product in enumerate(PRODUCTS):
+            m = rqMetrics(CLMatrix[i], product, policies[:, i, p, 0], policies[:, i, p, 1], l[i], tol=tol)
+            for name in metrics:
+                metrics[name][:, i, p] = m[name]
+    metrics['score'] = metrics['shortage'].sum(axis=(1, 2)) / n
+    return metrics
+
+def prunePolicies(policies, l, CLMatrix, keep=0.1, tol=1e-9):
+    """ Returns the indices of the keep share of policies with the best screened scores, best first """
+    scores = screenPolicies(policies, l, CLMatrix, tol)['score']
+    count = max(1, int(math.ceil(keep * len(scores))))
+    return np.argsort(scores, kind='stable')[:count]
+
+def meanTransfusionDemand(cl):
+    """ Returns the expected daily transfusion demand in pints of a platoon with combat level probabilities cl """
+    mean = 0.0
+    for level, weight in enumerate(levelProbabilities(cl)):
+        if level > 0:
+            # mean of max(0, N(level, level * spread)), the normal mean plus the part below zero cut off
+            sigma = level * PARAMETRIC.spread
+            z = level / sigma
+            casualties = level * 0.5 * (1 + math.erf(z / math.sqrt(2))) + sigma * math.exp(-z * z / 2) / math.sqrt(2 * math.pi)
+            mean += weight * casualties * CASUALTY_SCALE * EXPONENTIAL_MEAN
+    return mean
+
+def fluidScenario(T, CLMatrix, avgOrderInterval):
+    """ Returns a one-replication DemandScenario in which every platoon demands its expected transfusion demand every
+        day and orders every avgOrderInterval days, the deterministic fluid version of the company's random inputs """
+    n = len(CLMatrix)
+    mean = np.array([meanTransfusionDemand(cl) for cl in CLMatrix])
+    transfusionDemand = np.broadcast_to(mean, (1, T + 1, n)).copy()
+    orderIntervals = np.broadcast_to(np.asarray(avgOrderInterval, dtype=np.int64), (1, T + 1, n)).copy()
+    combatLevels = np.zeros((1, T + 1, n), dtype=np.int8)
+    casualties = transfusionDemand / (CASUALTY_SCALE * EXPONENTIAL_MEAN)
+    return DemandScenario(combatLevels, casualties, transfusionDemand, orderIntervals)
+
+def fluidCompany(T, n, l, avgOrderInterval, maxOrderInterval, TargetInv, PI, CI, CLMatrix, storage=BloodProductStorage, asResult=False):
+    """ Runs the transport feedback simulation of the whole company on its fluid scenario, every platoon using its
+        expected demand and ordering on a fixed interval. Takes the arguments of TFSim and returns its output, the
+        deterministic trajectory of transport use, unmet demand and expiry around which the stochastic runs spread """
+    scenario = fluidScenario(T, CLMatrix, avgOrderInterval)
+    return TFSim(T, n, l, avgOrderInterval, maxOrderInterval, TargetInv, PI, CI, CLMatrix, storage, scenario=scenario, asResult=asResult)
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+from ResultWriter import resultColumns
+
+class SimulationResult:
+  """ Preallocated in-memory result of one TFSim run.
+      Company.timeStep writes each day's metrics straight into the row nextRow hands out, so no per-day lists are
+      built and no transpose is needed. It shares the nextRow/row/flush protocol of ResultWriter, so TFSim treats
+      both as sinks.
+      Attributes :
+      data - integer array (T, n + 1, 6), slot n of the second axis holds the company totals and the last axis the
+             metrics in toDF order
+      n - number of platoons
+      days - number of days written """
+  def __init__(self, T, n):
+    self.data = np.zeros((T, n + 1, 6), dtype=np.int64)
+    self.n = n
+    self.days = 0
+    self._df = None
+
+  def nextRow(self, replication=0):
+    """ Returns the writable (n, 6) row of the next day """
+    out = self.data[self.days, :self.n]
+    self.days += 1
+    self._df = None
+    return out
+
+  def row(self, output, replication=0):
+    """ Appends the output of one Company.timeStep() given as lists per metric """
+    self.nextRow(replication)[:] = np.asarray(output).T
+
+  def flush(self):
+    """ Computes the company totals of every day written with one reduction """
+    self.data[:self.days, self.n] = self.data[:self.days, :self.n].sum(axis=1)
+
+  @property
+  def platoons(self):
+    """ Array (days, n, 6) of the platoon metrics """
+    return self.data[:self.days, :self.n]
+
+  @property
+  def company(self):
+    """ Array (days, 6) of the company totals """
+    return self.data[:self.days, self.n]
+
+  def toDF(self):
+    """ Returns the result as the DataFrame toDF builds, created on first use as a view of data """
+    if self._df is None:
+      self.flush()
+      self._df = pd.DataFrame(self.data[:self.days].reshape(self.days, (self.n + 1) * 6), columns=resultColumns(self.n), copy=False)
+    return self._df
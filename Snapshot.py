@@ -0,0 +1,143 @@
+import io
+import os
+import pickle
+import zlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from RandomStreams import spawnSeeds
+
+GLOBAL_RNG = 'np.random' #persistent id of the np.random module, which platoons without a Generator draw from
+
+class _Pickler(pickle.Pickler):
+    def persistent_id(self, obj):
+        return GLOBAL_RNG if obj is np.random else None
+
+class _Unpickler(pickle.Unpickler):
+    def persistent_load(self, pid):
+        if pid == GLOBAL_RNG:
+            return np.random
+        raise pickle.UnpicklingError('unknown persistent id ' + str(pid))
+
+def snapshot(company, day=0, level=1):
+    """ Captures the full state of a simulation mid-run as compact bytes: the company, its platoons with their storages,
+        countdowns and running demand, the transports and the state of every Generator. Platoons drawing from the global
+        np.random state keep drawing from it after a restore, so its state is captured too.
+        Args :
+        company - TF or QR Company, or any picklable object holding one
+        day - day the state is at, the number of days already simulated
+        level - zlib compression level, 1 is fast and already shrinks storages of many lots several times
+        Returns :
+        bytes that restore turns back into an independent copy of the state """
+    buffer = io.BytesIO()
+    _Pickler(buffer, pickle.HIGHEST_PROTOCOL).dump((day, company, np.random.get_state()))
+    return zlib.compress(buffer.getvalue(), level)
+
+def restore(data, globalState=True):
+    """ Rebuilds a state captured by snapshot.
+        Args :
+        data - bytes returned by snapshot or read by loadSnapshot
+        globalState - also reset the global np.random state to the one captured, so an unseeded run resumes exactly
+        Returns :
+        (company, day) """
+    day, company, state = _Unpickler(io.BytesIO(zlib.decompress(data))).load()
+    if globalState:
+        np.random.set_state(state)
+    return company, day
+
+def saveSnapshot(path, company, day=0):
+    """ Writes a snapshot to a file, e.g. as a checkpoint a long run can be resumed from with loadSnapshot """
+    data = snapshot(company, day)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(data)
+    os.replace(path + '.tmp', path) # a run killed mid-write leaves the previous checkpoint intact
+    return data
+
+def loadSnapshot(path, globalState=True):
+    """ Restores the state saved by saveSnapshot, returns (company, day) """
+    with open(path, 'rb') as f:
+        return restore(f.read(), globalState)
+
+def reseed(company, seed):
+    """ Gives platoon i of a company a fresh Generator on the i-th stream spawned from seed, as the engines seed platoons.
+        Platoons consuming a DemandScenario still follow it, only their own draws change. """
+    for platoon, child in zip(company.platoonList, spawnSeeds(seed, len(company.platoonList))):
+        platoon.rng = np.random.default_rng(child)
+
+def fork(data, N, seed=None):
+    """ Branches N independent continuations from one snapshot, continuation k restored and reseeded with the k-th seed
+        spawned from seed.
+        Returns :
+        list of N (company, day) pairs """
+    continuations = []
+    for child in spawnSeeds(seed, N):
+        company, day = restore(data, globalState=False)
+        reseed(company, child)
+        continuations.append((company, day))
+    return continuations
+
+def forkRun(company, day, fn, N, seed=None, workers=None, copyOnWrite=None):
+    """ Runs N independent continuations of a warmed-up state in parallel and returns their results in order.
+        Continuation k calls fn(company, day) on its own copy of the state, reseeded with the k-th seed spawned from seed,
+        so results depend only on seed. The warm-up that produced the state is paid once instead of once per continuation.
+        Args :
+        company, day - state to branch from and the day it is at, e.g. a company run through its warm-up
+        fn - callable fn(company, day) continuing the run and returning a picklable result, e.g. one calling runCompany
+        N - number of continuations
+        seed - integer or SeedSequence the continuation seeds are spawned from
+        workers - number of processes running at once, None uses every core and 1 runs in this process
+        copyOnWrite - fork a process per continuation that inherits the state copy-on-write instead of unpickling a
+                      snapshot, the default where os.fork exists; fn need not be picklable then
+        Returns :
+        list of the N results """
+    seeds = spawnSeeds(seed, N)
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        data = snapshot(company, day)
+        return [_continue(data, fn, child) for child in seeds]
+    if copyOnWrite is None:
+        copyOnWrite = hasattr(os, 'fork')
+    if not copyOnWrite:
+        data = snapshot(company, day)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(_continue, [data] * N, [fn] * N, seeds))
+
+    context = multiprocessing.get_context('fork')
+    results = []
+    running = [] #(process, receiving end of its pipe) of the continuations started, oldest first
+    for k in range(N):
+        if len(running) == workers:
+            results.append(_collect(running))
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=_forked, args=(company, day, fn, seeds[k], sender))
+        process.start()
+        sender.close()
+        running.append((process, receiver))
+    while len(running) > 0:
+        results.append(_collect(running))
+    return results
+
+def _collect(running):
+    """ Waits for the oldest running continuation and returns its result """
+    process, receiver = running.pop(0)
+    status, value = receiver.recv()
+    process.join()
+    if status == 'error':
+        for other, pipe in running:
+            other.terminate()
+        raise RuntimeError('continuation failed: ' + value)
+    return value
+
+def _continue(data, fn, seed):
+    company, day = restore(data, globalState=False)
+    reseed(company, seed)
+    return fn(company, day)
+
+def _forked(company, day, fn, seed, sender):
+    # runs in a forked child that shares the parent's state copy-on-write, so nothing is pickled on the way in
+    try:
+        reseed(company, seed)
+        sender.send(('ok', fn(company, day)))
+    except Exception as e:
+        sender.send(('error', f'{type(e).__name__}: {e}'))
+    sender.close()
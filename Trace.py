@@ -0,0 +1,127 @@
+import numpy as np
+
+# trace levels, each includes the events of the levels below it
+OFF = 0
+SUMMARY = 1 #totals of every metric per platoon at the end of a run
+DAILY = 2 #metrics of every platoon every day
+FULL = 3 #every lot and platoon state every day
+LEVELS = {'off': OFF, 'summary': SUMMARY, 'daily': DAILY, 'full': FULL}
+
+# event kinds and the meaning of their values
+KIND_SUMMARY = 0 #TransDays, TransSpace, FWBUnmet, PlasmaUnmet, FWBExpired, PlasmaExpired summed over the run
+KIND_DAILY = 1 #TransDays, TransSpace, FWBUnmet, PlasmaUnmet, FWBExpired, PlasmaExpired of one day
+KIND_LOT = 2 #number of units, days until experation, days until arrival
+KIND_PLATOON = 3 #combat level, days until next order, running FWB demand, running Plasma demand
+KINDS = {'summary': KIND_SUMMARY, 'daily': KIND_DAILY, 'lot': KIND_LOT, 'platoon': KIND_PLATOON}
+
+COMPANY = -1 #platoon field of company events
+PRODUCTS = ['FWB', 'Plasma']
+NO_PRODUCT = 255
+
+TRACE_DTYPE = np.dtype([('replication', '<i4'), ('day', '<i4'), ('kind', 'u1'), ('product', 'u1'), ('platoon', '<i2'), ('values', '<i8', (6,))])
+
+class Tracer:
+  """ Collects structured trace events of TFSim runs as TRACE_DTYPE records.
+      Events are kept in a ring buffer of capacity records, so only the most recent ones survive, or when a path is
+      given the buffer is appended to that binary trace file whenever it fills up, keeping every event.
+      TraceViewer pretty-prints and filters the records afterwards.
+      Attributes :
+      level - OFF, SUMMARY, DAILY or FULL
+      capacity - number of records buffered
+      path - trace file the records are appended to, None keeps them in the ring buffer only
+      buffer - structured array of the buffered records
+      count - number of records emitted in total
+      written - number of records appended to the trace file
+      totals - (platoons, 6) metric totals of the run being traced """
+  def __init__(self, level=DAILY, capacity=65536, path=None):
+    self.level = LEVELS[level] if isinstance(level, str) else level
+    self.capacity = capacity
+    self.path = path
+    self.buffer = np.zeros(capacity, dtype=TRACE_DTYPE)
+    self.count = 0
+    self.written = 0
+    self.totals = None
+    if path is not None:
+      open(path, 'wb').close()
+
+  def emit(self, records):
+    """ Adds a structured array of TRACE_DTYPE records """
+    for start in range(0, len(records), self.capacity):
+      block = records[start:start + self.capacity]
+      if self.path is not None and self.count - self.written + len(block) > self.capacity:
+        self.flush()
+      self.buffer[(self.count + np.arange(len(block))) % self.capacity] = block
+      self.count += len(block)
+
+  def flush(self):
+    """ Appends the records not yet written to the trace file """
+    if self.path is None or self.written == self.count:
+      return
+    with open(self.path, 'ab') as f:
+      self.buffer[(self.written + np.arange(self.count - self.written)) % self.capacity].tofile(f)
+    self.written = self.count
+
+  def records(self):
+    """ Returns the records still in the ring buffer in the order they were emitted """
+    if self.count <= self.capacity:
+      return self.buffer[:self.count].copy()
+    pos = self.count % self.capacity
+    return np.concatenate([self.buffer[pos:], self.buffer[:pos]])
+
+  def day(self, replication, day, company, output):
+    """ Traces day of a run from the company after its timestep and the (platoons, 6) metrics it returned """
+    if self.level >= SUMMARY:
+      self.totals = output.copy() if self.totals is None else self.totals + output
+    if self.level >= DAILY:
+      records = np.zeros(len(output), dtype=TRACE_DTYPE)
+      records['kind'] = KIND_DAILY
+      records['product'] = NO_PRODUCT
+      records['platoon'] = np.arange(len(output))
+      records['values'] = output
+      self._stamp(records, replication, day)
+    if self.level >= FULL:
+      self._state(replication, day, company)
+
+  def summary(self, replication, day):
+    """ Traces the metric totals of the run ending on day and starts the totals of the next run """
+    if self.level >= SUMMARY and self.totals is not None:
+      records = np.zeros(len(self.totals) + 1, dtype=TRACE_DTYPE)
+      records['kind'] = KIND_SUMMARY
+      records['product'] = NO_PRODUCT
+      records['platoon'] = list(range(len(self.totals))) + [COMPANY]
+      records['values'][:-1] = self.totals
+      records['values'][-1] = self.totals.sum(axis=0)
+      self._stamp(records, replication, day)
+    self.totals = None
+
+  def _state(self, replication, day, company):
+    rows = []
+    holders = [(COMPANY, company)] + list(enumerate(company.platoonList))
+    for i, holder in holders:
+      for p, storage in enumerate([holder.FWBinventory, holder.Plasmainventory]):
+        for lot in storage.inventory:
+          rows.append((KIND_LOT, p, i, (lot[0], lot[1], lot[2], 0, 0, 0)))
+      if i != COMPANY:
+        rows.append((KIND_PLATOON, NO_PRODUCT, i, (holder.combatLevel, holder.orderCountDown, holder.runningDemand[0], holder.runningDemand[1], 0, 0)))
+    records = np.zeros(len(rows), dtype=TRACE_DTYPE)
+    for k, (kind, product, platoon, values) in enumerate(rows):
+      records[k]['kind'] = kind
+      records[k]['product'] = product
+      records[k]['platoon'] = platoon
+      records[k]['values'] = values
+    self._stamp(records, replication, day)
+
+  def _stamp(self, records, replication, day):
+    records['replication'] = replication
+    records['day'] = day
+    self.emit(records)
+
+  def close(self):
+    self.flush()
+
+
+def readTrace(path, mmap=True):
+  """ Reads a trace file written by a Tracer as a structured array of TRACE_DTYPE records """
+  if mmap:
+    return np.memmap(path, dtype=TRACE_DTYPE, mode='r')
+  return np.fromfile(path, dtype=TRACE_DTYPE)
@@ -0,0 +1,62 @@
+import argparse
+import numpy as np
+from Trace import readTrace, KINDS, KIND_SUMMARY, KIND_DAILY, KIND_LOT, KIND_PLATOON, COMPANY, PRODUCTS
+
+METRIC_NAMES = ['TransDays', 'TransSpace', 'FWBUnmet', 'PlasmaUnmet', 'FWBExpired', 'PlasmaExpired']
+
+def filterTrace(records, kinds=None, replication=None, platoon=None, first=None, last=None):
+    """ Selects trace records.
+        Args :
+        records - structured array of trace records
+        kinds - list of kind names ('summary', 'daily', 'lot', 'platoon') to keep, all when None
+        replication - replication to keep, all when None
+        platoon - platoon number to keep counting from 1, 0 for the company, all when None
+        first, last - range of days to keep
+        Returns :
+        structured array of the selected records """
+    keep = np.ones(len(records), dtype=bool)
+    if kinds is not None:
+        keep &= np.isin(records['kind'], [KINDS[k] for k in kinds])
+    if replication is not None:
+        keep &= records['replication'] == replication
+    if platoon is not None:
+        keep &= records['platoon'] == (COMPANY if platoon == 0 else platoon - 1)
+    if first is not None:
+        keep &= records['day'] >= first
+    if last is not None:
+        keep &= records['day'] <= last
+    return records[keep]
+
+def formatRecord(record):
+    """ Returns one trace record as a line of text """
+    holder = 'Company' if record['platoon'] == COMPANY else 'Platoon' + str(record['platoon'] + 1)
+    values = record['values']
+    head = f"rep {record['replication']:>4} day {record['day']:>5} {holder:<10}"
+    if record['kind'] in (KIND_SUMMARY, KIND_DAILY):
+        label = 'total' if record['kind'] == KIND_SUMMARY else 'daily'
+        return head + f" {label:<7} " + ' '.join(f'{name}={v}' for name, v in zip(METRIC_NAMES, values))
+    if record['kind'] == KIND_LOT:
+        return head + f" lot     {PRODUCTS[record['product']]:<6} units={values[0]} expires={values[1]} arrives={values[2]}"
+    if record['kind'] == KIND_PLATOON:
+        return head + f" state   combatLevel={values[0]} timeToOrder={values[1]} runningDemand=[{values[2]}, {values[3]}]"
+    return head + ' unknown ' + str(values.tolist())
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pretty-prints and filters a TFSim trace file written by Trace.Tracer')
+    parser.add_argument('path', help='trace file')
+    parser.add_argument('--kind', action='append', choices=sorted(KINDS), help='kind of event to show, may be repeated')
+    parser.add_argument('--replication', type=int)
+    parser.add_argument('--platoon', type=int, help='platoon number counting from 1, 0 for the company')
+    parser.add_argument('--first', type=int, help='first day shown')
+    parser.add_argument('--last', type=int, help='last day shown')
+    parser.add_argument('--limit', type=int, help='largest number of events shown')
+    args = parser.parse_args(argv)
+
+    records = filterTrace(readTrace(args.path), args.kind, args.replication, args.platoon, args.first, args.last)
+    if args.limit is not None:
+        records = records[:args.limit]
+    for record in records:
+        print(formatRecord(record))
+
+if __name__ == '__main__':
+    main()
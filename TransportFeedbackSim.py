@@ -1,37 +1,77 @@
 from Company import Company
 from transport import Transport
+from FleetDispatcher import FleetDispatcher
+from Routing import Router, distanceMatrix
 from BloodProductStorage import BloodProductStorage
 from platoon import Platoon
+from RandomStreams import spawnGenerators
+from SimulationResult import SimulationResult
 import numpy as np
 import pandas as pd
 
-def TFSim(T, n, l, avgOrderInterval, maxOrderInterval, TargetInv, PI, CI, CLMatrix):
-    
+def TFSim(T, n, l, avgOrderInterval, maxOrderInterval, TargetInv, PI, CI, CLMatrix, storage=BloodProductStorage, seed=None, trace=None, scenario=None, replication=0, sink=None, asResult=False, onDay=None, fleet=None, coordinates=None, demandModel=None):
+    #storage - inventory backend class used for the company and every platoon, BloodProductStorage or BucketProductStorage
+    #seed - integer or SeedSequence giving every platoon its own Generator, the global np.random state is used when None
+    #trace - Trace.Tracer recording the run at its level, nothing is traced or printed when None
+    #scenario, replication - DemandScenario and the replication of it to consume instead of drawing random numbers
+    #sink - ResultWriter the daily output is streamed into as row replication instead of being returned, None is returned then
+    #asResult - return the SimulationResult instead of its DataFrame
+    #fleet - list of Transport objects shared by all platoons through a FleetDispatcher, None gives each platoon its own transport
+    #coordinates - list of length n of (x, y) platoon positions in days at speed 1, with a fleet the day's orders are then
+    #              routed as multi-stop tours
+    #onDay - callback called as onDay(day, company) after every simulated day, e.g. a Profiling.MemorySnapshots
+    #demandModel - DemandModels model or registered name the platoons draw demand from, the parametric model when None
+    company1 = buildCompany(n, l, avgOrderInterval, maxOrderInterval, TargetInv, PI, CI, CLMatrix, storage, seed, scenario, replication, fleet, coordinates, demandModel)
+
+    result = SimulationResult(T, n) if sink is None else sink
+    runCompany(company1, T, result, 0, replication, trace, onDay)
+    if trace is not None:
+        trace.summary(replication, T)
+    if sink is not None:
+        return None
+    if asResult:
+        return result
+    return result.toDF()
+
+def runCompany(company1, T, result, start=0, replication=0, trace=None, onDay=None):
+    #runs a built company from the end of day start to the end of day T, the run phase of TFSim after buildCompany
+    #result - SimulationResult or ResultWriter the output of the T - start days is written to and flushed
+    #start - day the company's state is at, non-zero when resuming a Snapshot taken mid-run
+    #replication, trace, onDay - as for TFSim, trace and onDay see the absolute day numbers
+    for i in range(start, T):
+        output = company1.timeStep(out=result.nextRow(replication))
+        if trace is not None:
+            trace.day(replication, i + 1, company1, output)
+        if onDay is not None:
+            onDay(i + 1, company1)
+    result.flush()
+    return result
+
+def buildCompany(n, l, avgOrderInterval, maxOrderInterval, TargetInv, PI, CI, CLMatrix, storage=BloodProductStorage, seed=None, scenario=None, replication=0, fleet=None, coordinates=None, demandModel=None):
+    #builds the company and platoons of a TFSim run in their state before day 1, the arguments are those of TFSim
+    if scenario is not None and scenario.orderIntervals is None:
+        raise ValueError('TFSim needs a scenario with pre-drawn order intervals, generate it with avgOrderInterval and maxOrderInterval')
+    rngs = spawnGenerators(seed, n)
     platoons = []
     for i in range(n):
-        p = Platoon(l[i], BloodProductStorage([]), BloodProductStorage([]), CLMatrix[i], avgOrderInterval[i], maxOrderInterval[i], TargetInv[i])
+        p = Platoon(l[i], storage([]), storage([]), CLMatrix[i], avgOrderInterval[i], maxOrderInterval[i], TargetInv[i], rngs[i],
+                    None if scenario is None else scenario.platoon(replication, i), demandModel)
         for item in PI[i]:
             p.addInventory(item[0], item[1], item[2], 0)
         platoons.append(p)
 
-    company1 = Company(BloodProductStorage([]), BloodProductStorage([]), [], platoons)
-    company1.addTransport(Transport(1, 10000, 'Platoon1T1'))
-    company1.addTransport(Transport(1, 10000, 'Platoon2T1'))
+    if fleet is None:
+        company1 = Company(storage([]), storage([]), [], platoons)
+        for i in range(n):
+            company1.addTransport(Transport(1, 10000, 'Platoon'+str(i+1)+'T1'))
+    else:
+        router = None if coordinates is None else Router(distanceMatrix(l, coordinates))
+        company1 = Company(storage([]), storage([]), list(fleet), platoons, FleetDispatcher(fleet, platoons, router))
 
     for item in CI:
         company1.addInventory(item[0], item[1], item[2])
 
-    result = []
-    for i in range(T):
-        output = company1.timeStep()
-        print(output)
-        result.append(output)
-        company1.print()
-
-    result = np.array(result).T
-    resultDF = toDF(result)
-    print(resultDF)
-    return resultDF
+    return company1
 
 def toDF(result):
     df = pd.DataFrame()
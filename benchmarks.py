@@ -0,0 +1,255 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import numpy as np
+from BloodProductStorage import BloodProductStorage
+from BucketProductStorage import BucketProductStorage
+
+# preset grids of (platoons, days, lots) for the end-to-end benchmarks
+SIZES = {
+    'small': [(2, 15, 10), (20, 100, 1000)],
+    'medium': [(2, 15, 10), (20, 365, 1000), (200, 365, 10000)],
+    'large': [(2, 15, 10), (200, 365, 10000), (1000, 730, 50000), (5000, 3650, 100000)],
+}
+STORAGE_LOTS = {'small': [10, 1000], 'medium': [10, 1000, 10000], 'large': [10, 1000, 10000, 100000]}
+# cold import time budget in seconds of every entry point, and the libraries none of them may load on import
+IMPORT_BUDGETS = {'main': 0.5, 'BatchRunner': 0.5, 'TransportFeedbackSim': 1.0, 'QRSimulation': 1.0, 'visualize': 1.5,
+                  'streamlit_app': 3.0}
+HEAVY_MODULES = ['matplotlib', 'seaborn', 'skopt', 'sklearn', 'scipy']
+# simulation engines the UI entry points import only when a simulation is run
+ENGINE_MODULES = ['TransportFeedbackSim', 'BatchTransportFeedbackSim', 'NextEventSim', 'Company', 'FleetDispatcher',
+                  'Routing', 'QRSimulation', 'QRCompany']
+ENTRY_HEAVY_MODULES = {'visualize': HEAVY_MODULES + ENGINE_MODULES, 'streamlit_app': HEAVY_MODULES + ENGINE_MODULES}
+
+def syntheticCompany(platoons, days, lots, seed=0):
+    """ Generates TFSim inputs of a company of any size.
+        Lots are split evenly between the company and its platoons, every lot outlives the horizon and the company holds
+        enough units that it never runs short, so runs of any length complete.
+        Args :
+        platoons - number of platoons, 2 to 5000
+        days - horizon in days, 15 to 3650
+        lots - number of initial inventory lots, 10 to 100000
+        seed - seed of the generator
+        Returns :
+        dictionary of the TFSim inputs T, n, l, avgOrderInterval, maxOrderInterval, TargetInv, PI, CI, CLMatrix """
+    rng = np.random.default_rng(seed)
+    n = platoons
+    l = rng.integers(1, 6, n).tolist()
+    avgOrderInterval = rng.integers(2, 6, n).tolist()
+    maxOrderInterval = [a + int(k) for a, k in zip(avgOrderInterval, rng.integers(1, 4, n))]
+    TargetInv = [[int(t), int(t) // 25] for t in rng.integers(500, 1500, n)]
+    CLMatrix = rng.dirichlet([8, 4, 2, 1, 1], n).tolist()
+
+    platoonLots = lots // 2
+    PI = [[] for i in range(n)]
+    for k in range(platoonLots):
+        product = 'Plasma' if k % 10 == 0 else 'FWB'
+        PI[k % n].append([product, int(rng.integers(1, 100)), days + int(rng.integers(1, 300))])
+    companyLots = max(lots - platoonLots, 2)
+    # about 150 units per platoon-day covers the heaviest demand the combat levels produce
+    units = 150 * n * (days + 1) // companyLots + 1
+    CI = [['Plasma' if k % 10 == 0 else 'FWB', units, days + int(rng.integers(1, 300))] for k in range(companyLots)]
+    return {'T': days, 'n': n, 'l': l, 'avgOrderInterval': avgOrderInterval, 'maxOrderInterval': maxOrderInterval,
+            'TargetInv': TargetInv, 'PI': PI, 'CI': CI, 'CLMatrix': CLMatrix}
+
+def _timed(fn, repeat=3):
+    """ Returns the best wall time of repeat calls of fn in seconds """
+    best = np.inf
+    for r in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def benchmarkStorage(storage, lots, ops=2000, seed=0):
+    """ Micro-benchmarks the operations of a storage class holding lots on-hand lots.
+        Returns :
+        dictionary from operation to operations per second """
+    rng = np.random.default_rng(seed)
+    expiries = rng.integers(1, 300, lots)
+    # lots hold enough units that use and export never run the storage dry
+    inventory = [(int(rng.integers(1, 100)) + 5 * ops // lots, int(e), 0) for e in expiries]
+    results = {}
+
+    def build():
+        return storage(inventory)
+    results['build_lots'] = lots / _timed(build)
+
+    s = build()
+    exp = rng.integers(1, 300, ops)
+    arrival = rng.integers(0, 5, ops)
+    def add():
+        for e, a in zip(exp, arrival):
+            s.add(10, int(e), int(a))
+    results['add'] = ops / _timed(add, 1)
+
+    s = build()
+    def use():
+        for k in range(ops):
+            s.use(5)
+    results['use'] = ops / _timed(use, 1)
+
+    s = build()
+    def export():
+        for k in range(ops):
+            s.export(3)
+    results['export'] = ops / _timed(export, 1)
+
+    s = build()
+    steps = min(ops, 290)
+    def timestep():
+        for k in range(steps):
+            s.timestep()
+    results['timestep'] = steps / _timed(timestep, 1)
+
+    s = build()
+    def avail():
+        for k in range(ops):
+            s.avail()
+    results['avail'] = ops / _timed(avail, 1)
+    return results
+
+def benchmarkTFSim(platoons, days, lots, seed=0, repeat=1, **kwargs):
+    """ Returns the throughput of TFSim on a synthetic company in simulated platoon-days per second """
+    from TransportFeedbackSim import TFSim
+    inputs = syntheticCompany(platoons, days, lots, seed)
+    elapsed = _timed(lambda: TFSim(**inputs, seed=seed, **kwargs), repeat)
+    return platoons * days / elapsed
+
+def benchmarkQRSim(platoons, days, lots, seed=0, repeat=1):
+    """ Returns the throughput of QRSimulation.sim on a synthetic company in simulated platoon-days per second.
+        sim reads its inputs from module globals, which are swapped for the synthetic ones during the run """
+    import QRSimulation
+    inputs = syntheticCompany(platoons, days, lots, seed)
+    rng = np.random.default_rng(seed)
+    policy = []
+    for i in range(platoons):
+        policy += [int(rng.integers(200, 800)), int(rng.integers(500, 2000)), int(rng.integers(0, 15)), int(rng.integers(10, 50))]
+    saved = {name: getattr(QRSimulation, name) for name in ['T', 'n', 'l', 'I', 'CLMatrix']}
+    QRSimulation.T = days
+    QRSimulation.n = platoons
+    QRSimulation.l = inputs['l']
+    QRSimulation.I = [[[item[2], item[0], item[1]] for item in lots] for lots in inputs['PI']]
+    QRSimulation.CLMatrix = inputs['CLMatrix']
+    try:
+        elapsed = _timed(lambda: QRSimulation.sim(policy, seed=seed), repeat)
+    finally:
+        for name, value in saved.items():
+            setattr(QRSimulation, name, value)
+    return platoons * days / elapsed
+
+def importTime(module, repeat=3, heavyModules=HEAVY_MODULES):
+    """ Measures the cold import time of a module, importing it in a fresh interpreter repeat times.
+        Interpreter startup is not counted, only the import statement.
+        Returns :
+        (best time in seconds, list of the heavyModules the import loaded), or (None, error) when the import fails """
+    code = ('import json, sys, time\n'
+            'start = time.perf_counter()\n'
+            f'import {module}\n'
+            'elapsed = time.perf_counter() - start\n'
+            f'print(json.dumps([elapsed, [m for m in {list(heavyModules)!r} if m in sys.modules]]))\n')
+    here = os.path.dirname(os.path.abspath(__file__))
+    best = np.inf
+    for r in range(repeat):
+        run = subprocess.run([sys.executable, '-c', code], cwd=here, capture_output=True, text=True)
+        if run.returncode != 0:
+            lines = run.stderr.strip().splitlines()
+            return None, lines[-1] if len(lines) > 0 else 'exit code ' + str(run.returncode)
+        elapsed, heavy = json.loads(run.stdout.strip().splitlines()[-1])
+        best = min(best, elapsed)
+    return best, heavy
+
+def checkImports(budgets=IMPORT_BUDGETS, repeat=3):
+    """ Measures the cold import time of every entry point against its budget. The UI entry points must not load the
+        simulation engines either, see ENTRY_HEAVY_MODULES.
+        Returns :
+        list of (module, seconds, budget, heavy modules loaded or the import error, failed), an entry point that cannot be
+        imported counts as failed """
+    rows = []
+    for module, budget in budgets.items():
+        elapsed, heavy = importTime(module, repeat, ENTRY_HEAVY_MODULES.get(module, HEAVY_MODULES))
+        rows.append((module, elapsed, budget, heavy, elapsed is None or elapsed > budget or len(heavy) > 0))
+    return rows
+
+def runBenchmarks(size='small', engines=('tf', 'qr'), seed=0):
+    """ Runs the storage micro-benchmarks and end-to-end benchmarks of a preset size.
+        Returns :
+        dictionary with the environment under 'meta' and every measurement under 'results', higher is better """
+    results = {}
+    for storage in [BloodProductStorage, BucketProductStorage]:
+        for lots in STORAGE_LOTS[size]:
+            for op, rate in benchmarkStorage(storage, lots, seed=seed).items():
+                results[f'{storage.__name__}.{op}[lots={lots}]'] = {'value': rate, 'unit': 'ops/s'}
+    for platoons, days, lots in SIZES[size]:
+        key = f'[platoons={platoons},days={days},lots={lots}]'
+        if 'tf' in engines:
+            results['TFSim' + key] = {'value': benchmarkTFSim(platoons, days, lots, seed), 'unit': 'platoon-days/s'}
+            results['TFSim(BucketProductStorage)' + key] = {'value': benchmarkTFSim(platoons, days, lots, seed, storage=BucketProductStorage),
+                                                           'unit': 'platoon-days/s'}
+        if 'qr' in engines:
+            results['QRSim' + key] = {'value': benchmarkQRSim(platoons, days, lots, seed), 'unit': 'platoon-days/s'}
+    meta = {'size': size, 'seed': seed, 'python': sys.version.split()[0], 'numpy': np.__version__,
+            'platform': platform.platform(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    return {'meta': meta, 'results': results}
+
+def compare(current, baseline, tolerance=0.2):
+    """ Compares two benchmark reports.
+        Args :
+        current, baseline - dictionaries returned by runBenchmarks
+        tolerance - relative slowdown reported as a regression
+        Returns :
+        list of (name, baseline value, current value, ratio, regressed) for the benchmarks in both reports """
+    rows = []
+    for name, entry in current['results'].items():
+        if name in baseline['results']:
+            old = baseline['results'][name]['value']
+            ratio = entry['value'] / old if old > 0 else np.inf
+            rows.append((name, old, entry['value'], ratio, ratio < 1 - tolerance))
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks the blood product storages and the TF and QR simulations')
+    parser.add_argument('--size', choices=sorted(SIZES), default='small', help='preset grid of company sizes')
+    parser.add_argument('--engine', action='append', choices=['tf', 'qr'], help='simulations benchmarked end to end, both by default')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the report as JSON, e.g. a new baseline')
+    parser.add_argument('--compare', help='baseline JSON report to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='relative slowdown counted as a regression')
+    parser.add_argument('--imports', action='store_true',
+                        help='only report the cold import time of every entry point, failing when one is over budget or cannot be imported')
+    args = parser.parse_args(argv)
+
+    if args.imports:
+        failures = 0
+        for module, elapsed, budget, heavy, over in checkImports():
+            failures += over
+            if elapsed is None:
+                print(f'{module:<24} {"not importable":>10}  {heavy}  FAILED')
+                continue
+            loaded = '  loads ' + ', '.join(heavy) if len(heavy) > 0 else ''
+            print(f"{module:<24} {elapsed:>9.3f}s {budget:>6.1f}s budget{loaded}{'  OVER BUDGET' if over else ''}")
+        return 1 if failures > 0 else 0
+
+    report = runBenchmarks(args.size, args.engine or ['tf', 'qr'], args.seed)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare is None:
+        for name, entry in report['results'].items():
+            print(f"{name:<70} {entry['value']:>14.1f} {entry['unit']}")
+        return 0
+
+    with open(args.compare) as f:
+        baseline = json.load(f)
+    regressions = 0
+    for name, old, new, ratio, regressed in compare(report, baseline, args.tolerance):
+        regressions += regressed
+        print(f"{name:<70} {old:>14.1f} {new:>14.1f} {ratio:>7.2f}x{'  REGRESSION' if regressed else ''}")
+    return 1 if regressions > 0 else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
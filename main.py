@@ -1,5 +1,4 @@
-from TransportFeedbackSim import TFSim
-from QRSimulation import QRsim
+import argparse
 
 simType = 'TF' #Type of simulation to run. 'QR' or 'TF'
 
@@ -16,7 +15,32 @@ CI = [['FWB', 2000, 40], ['Plasma', 2000, 300], ['FWB', 15000, 10], ['FWB', 1000
 CLMatrix = [[0.5, 0.2, 0.1, 0.05, 0.05], [0.7, 0.2, 0.05, 0.03, 0.02]] #List of length n of a list of the probability of being at each combat level 0 to 4 for each platoon. Probabilities must add to 1.
 
 
-if simType == 'QR':
-    QRsim()
-elif simType == 'TF':
-    TFSim(T, n, l, avgOrderInterval, maxOrderInterval, TargetInv, PI, CI, CLMatrix)
\ No newline at end of file
+def run(simType, onDay=None):
+    #onDay - day callback passed on to TFSim, e.g. Profiling.MemorySnapshots
+    #the engines are imported here so that each run only loads the one it uses, QRSimulation pulls in skopt
+    if simType == 'QR':
+        from QRSimulation import QRsim
+        QRsim()
+    elif simType == 'TF':
+        from TransportFeedbackSim import TFSim
+        resultDF = TFSim(T, n, l, avgOrderInterval, maxOrderInterval, TargetInv, PI, CI, CLMatrix, onDay=onDay)
+        print(resultDF)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Runs the blood supply simulation with the inputs set in this file')
+    parser.add_argument('--sim', choices=['QR', 'TF'], default=simType, help='type of simulation to run')
+    parser.add_argument('--profile', metavar='PREFIX', help='profile the run, writing PREFIX.pstats and PREFIX.collapsed')
+    parser.add_argument('--sample-interval', type=float, default=0.001, help='seconds between stack samples of the profiler')
+    parser.add_argument('--memory-every', type=int, metavar='DAYS',
+                        help='with --profile, also take a tracemalloc snapshot every DAYS simulated days of a TF run and at its end')
+    args = parser.parse_args()
+    # the fixed global seed platoon.py used to set on import, kept for this script only so its unseeded runs still
+    # reproduce; libraries importing the engines keep their own global random state
+    import numpy as np
+    np.random.seed(2443563274)
+    if args.profile is None:
+        run(args.sim)
+    else:
+        from Profiling import profileRun
+        result, paths = profileRun(lambda onDay: run(args.sim, onDay), args.profile, args.sample_interval, args.memory_every)
+        print('Profile written to ' + ', '.join(paths))
\ No newline at end of file
@@ -41,6 +41,7 @@ from copy import Error
 import numpy as np
 import matplotlib.pyplot as plt
 import math
+from DemandModels import getModel, splitDemand
 
 class Transport:
   """ Class representing transport capabilities availiable for medicla logistics company
@@ -477,16 +478,8 @@ def PlatoonDemand(platoon):
      Returns :
      Quantities of FWB and Plasma demanded.
   """
-  numCasualities = 0
-  if platoon.combatLevel == 0:
-    numCasualities =  max(0,np.random.normal(platoon.combatLevel,platoon.combatLevel*0.5))
-  elif platoon.combatLevel == 1:
-    numCasualities =  max(0,np.random.normal(platoon.combatLevel,platoon.combatLevel*0.5))
-  else:
-    numCasualities =  max(0,np.random.normal(platoon.combatLevel,platoon.combatLevel*0.5))
-  TransfusionsDemand = numCasualities * 0.2 * np.random.exponential(0.1116)*4815
-  plasmaDemand = TransfusionsDemand * 0.02
-  return TransfusionsDemand - plasmaDemand, plasmaDemand
+  numCasualities, TransfusionsDemand = getModel().sampleOne(platoon.combatLevel, np.random)
+  return splitDemand(TransfusionsDemand)
 
 """## Platoon Code Testing"""
 
@@ -1,25 +1,42 @@
 import numpy as np
 from BloodProductStorage import BloodProductStorage
 from BloodInventoryUnit import BloodInventoryUnit
-np.random.seed(2443563274)
+from DemandModels import getModel, splitDemand
 class Platoon:
   """ Class representing medical platton that is serviced by some Medical Logisstics Company
       Attributes :
       location - location is defined as time in days in which transport with speed 1 can deliver supplies
       FWBInventoryArray - BloodProductStorage object containing current inventory of Fresh Whole Blood availiable to platoon
       PlasmaInventoryArray - BloodProductStorage object containing current inventory of Plasma availiable to platoon
-      combatLevelList - probabilities with which platoon is engaged in combat of certain intensity """
-  def __init__(self, loc, FWBinventory: BloodProductStorage, Plasmainventory: BloodProductStorage, cl, avgInterval, maxInterval, targetInv):
+      combatLevelList - probabilities with which platoon is engaged in combat of certain intensity, or a CombatSchedule
+                        schedule whose level changes with the day
+      rng - numpy Generator the platoon draws from, the global np.random state when none is given
+      scenario - PlatoonScenario of pre-drawn combat levels, demand and order intervals used instead of rng
+      draw - index of the scenario draw or schedule day currently in effect
+      demandModel - DemandModels model the platoon's demand is drawn from when it has no scenario """
+  def __init__(self, loc, FWBinventory: BloodProductStorage, Plasmainventory: BloodProductStorage, cl, avgInterval, maxInterval, targetInv, rng=None, scenario=None, demandModel=None):
     self.location = loc #time to deliver to platoon in days
     self.FWBinventory = FWBinventory
     self.Plasmainventory = Plasmainventory
     self.combatLevelList = cl #list of combat level probabilities, must sum to 1
     self.targetInv = targetInv #target inventory levels of the form [FWB target, Plasma target]
-    p = np.random.random()
-    cumulative_cl = np.cumsum(cl)
-    self.combatLevel = np.searchsorted(cumulative_cl, p) #The combat level on the current day sampled from
-    minInterval = max(1, avgInterval - (maxInterval - avgInterval))
-    self.orderCountDown = round(np.random.triangular(minInterval, avgInterval, maxInterval))
+    self.rng = np.random if rng is None else rng
+    self.scenario = scenario
+    self.draw = 0
+    self.demandModel = getModel(demandModel)
+    self.schedule = cl if hasattr(cl, 'draw') else None #schedule drawing the combat level of each day
+    self.cumulativeCL = None if self.schedule is not None else np.cumsum(cl)
+    if scenario is None:
+      if self.schedule is not None:
+        self.combatLevel = self.schedule.draw(0, None, self.rng)
+      else:
+        p = self.rng.random()
+        self.combatLevel = np.searchsorted(self.cumulativeCL, p) #The combat level on the current day sampled from
+      minInterval = max(1, avgInterval - (maxInterval - avgInterval))
+      self.orderCountDown = round(self.rng.triangular(minInterval, avgInterval, maxInterval))
+    else:
+      self.combatLevel = scenario.combatLevels[0]
+      self.orderCountDown = int(scenario.orderIntervals[0])
     self.runningDemand = [0,0] #resets when an order is placed
     self.avgOrderInterval = avgInterval
     self.maxOrderInterval = maxInterval
@@ -27,9 +44,28 @@ class Platoon:
 
   def updateCombatLevel(self):
     """ Method that updates the combat level based on combatLevelList for each new day"""
-    p = np.random.random()
-    cumulative_cl = np.cumsum(self.combatLevelList)
-    self.combatLevel = np.searchsorted(cumulative_cl, p)
+    if self.scenario is not None:
+      self.draw += 1
+      self.combatLevel = self.scenario.combatLevels[self.draw]
+      return
+    if self.schedule is not None:
+      self.draw += 1
+      self.combatLevel = self.schedule.draw(self.draw, self.combatLevel, self.rng)
+      return
+    p = self.rng.random()
+    self.combatLevel = np.searchsorted(self.cumulativeCL, p)
+
+
+  def skipTo(self, day):
+    """ Method that moves a platoon following a scenario to the end of an absolute day in one step, for days on which
+        nothing happens: no demand, no order, no arrival and no expiry. Leaves the platoon in the state that as many
+        calls of timeStep would. """
+    skipped = day - self.draw
+    self.draw = day
+    self.combatLevel = self.scenario.combatLevels[day]
+    self.orderCountDown -= skipped
+    self.FWBinventory.advance(day)
+    self.Plasmainventory.advance(day)
 
 
   def timeStep(self):
@@ -48,8 +84,11 @@ class Platoon:
      orderDemand = None
      if self.orderCountDown == 0:
        orderDemand = self.placeOrder()
-       minInterval = max(1, self.avgOrderInterval - (self.maxOrderInterval - self.avgOrderInterval))
-       self.orderCountDown = round(np.random.triangular(minInterval, self.avgOrderInterval, self.maxOrderInterval))
+       if self.scenario is not None:
+         self.orderCountDown = int(self.scenario.orderIntervals[self.draw])
+       else:
+         minInterval = max(1, self.avgOrderInterval - (self.maxOrderInterval - self.avgOrderInterval))
+         self.orderCountDown = round(self.rng.triangular(minInterval, self.avgOrderInterval, self.maxOrderInterval))
 
      return orderDemand, unMet[0], unMet[1], expiredFWB, expiredPlasma
 
@@ -89,6 +128,13 @@ class Platoon:
     return [self.FWBinventory.avail(), self.Plasmainventory.avail()]
 
 
+  def inventoryPosition(self):
+    """ Method that computes the inventory position of the platoon, stock on hand plus stock in transit.
+      Returns :
+        inventory position in FWB and Plasma quantities as a list."""
+    return [self.FWBinventory.position(), self.Plasmainventory.position()]
+
+
   def placeOrder(self):
     """ Method that etermines if an order needs to be placed by determining if the current inventory is below the given threshold.
         Returns :
@@ -117,14 +163,7 @@ def PlatoonDemand(platoon):
      Returns :
      Quantities of FWB and Plasma demanded.
   """
-  numCasualities = 0
-  if platoon.combatLevel == 0:
-    numCasualities =  max(0,np.random.normal(platoon.combatLevel,platoon.combatLevel*0.5))
-  elif platoon.combatLevel == 1:
-    numCasualities =  max(0,np.random.normal(platoon.combatLevel,platoon.combatLevel*0.5))
-  else:
-    numCasualities =  max(0,np.random.normal(platoon.combatLevel,platoon.combatLevel*0.5))
-  TransfusionsDemand = numCasualities * 0.2 * np.random.exponential(0.1116)*4815
-  plasmaDemand = TransfusionsDemand * 0.02
-  return TransfusionsDemand - plasmaDemand, plasmaDemand
-
+  if platoon.scenario is not None:
+    return splitDemand(platoon.scenario.transfusionDemand[platoon.draw])
+  numCasualities, TransfusionsDemand = platoon.demandModel.sampleOne(platoon.combatLevel, platoon.rng)
+  return splitDemand(TransfusionsDemand)
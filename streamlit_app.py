@@ -4,10 +4,9 @@ import io
 import os
 from streamlit_option_menu import option_menu
 
-# Simulation imports
-from TransportFeedbackSim import TFSim
-from QRSimulation import QRsim
-from visualize import *
+# Simulation imports. Streamlit re-executes this script on every widget interaction, so the engines are imported
+# when a simulation is run and visualize loads matplotlib and seaborn when the first plot is drawn
+import visualize
 from kpis import generate_kpis
 
 st.set_page_config(page_title="Blood Logistics Tool", layout="wide")
@@ -263,34 +262,36 @@ def show_simulation():
         pS  = [p["Size"] for p in data["med_log_company_info"]["Platoons"]]
 
         if data.get("simType","TF")=="TF":
+            from TransportFeedbackSim import TFSim
             avgdf, totaldf = TFSim(T,n,l,aI,mI,sS,tC,TInv,PI,CI,CLM,pS)
         else:
+            from QRSimulation import QRsim
             avgdf, totaldf = QRsim(T,n,l,aI,mI,sS,tC,TInv,PI,CI,CLM,pS)
 
         st.subheader("TotalDF")
         st.dataframe(totaldf)
 
         st.subheader("Daily Unmet Demand (zeros)")
-        plot_daily_unmet_demand_include_zeros(totaldf,pS); st.pyplot()
+        visualize.plot_daily_unmet_demand_include_zeros(totaldf,pS); st.pyplot()
 
         st.subheader("Daily Unmet Demand")
-        plot_daily_unmet_demand(totaldf,pS); st.pyplot()
+        visualize.plot_daily_unmet_demand(totaldf,pS); st.pyplot()
 
         st.subheader("Boxplot")
-        plot_unmet_demand_boxplot(totaldf); st.pyplot()
+        visualize.plot_unmet_demand_boxplot(totaldf); st.pyplot()
 
         st.subheader("Transport Usage")
-        plot_transport_usage(avgdf); st.pyplot()
+        visualize.plot_transport_usage(avgdf); st.pyplot()
 
         st.subheader("Transport Space")
-        plot_transport_space_usage(avgdf); st.pyplot()
+        visualize.plot_transport_space_usage(avgdf); st.pyplot()
 
         st.subheader("Histograms")
-        plot_platoon_transport_histograms(avgdf); st.pyplot()
-        plot_platoon_transport_space_histograms(avgdf); st.pyplot()
+        visualize.plot_platoon_transport_histograms(avgdf); st.pyplot()
+        visualize.plot_platoon_transport_space_histograms(avgdf); st.pyplot()
 
         st.subheader("Expired Inventory")
-        plot_expired(avgdf, platoon_sizes=pS); st.pyplot()
+        visualize.plot_expired(avgdf, platoon_sizes=pS); st.pyplot()
 
         st.subheader("KPIs")
         st.write(generate_kpis(totaldf,pS,threshold=1))
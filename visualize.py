@@ -1,7 +1,23 @@
-import matplotlib.pyplot as plt
+import importlib
 import numpy as np
-from platoon import Platoon, PlatoonDemand
-import seaborn as sns
+from platoon import Platoon
+from DemandModels import splitDemand
+from CombatSchedule import samplePaths
+
+class _LazyModule:
+    """ Stand-in for a module that is only imported when one of its attributes is first used, so importing visualize
+        does not pay for the plotting libraries until something is plotted """
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+plt = _LazyModule('matplotlib.pyplot')
+sns = _LazyModule('seaborn')
 
 def plot_daily_unmet_demand_include_zeros(df, platoonSize, save_path="figures/unmet_demand_histogram.png",show_plot=True,clip_percentile=0.99,show_kde=True, use_log_scale=False):
     df['Company_TotalUnmet'] = df['Company_FWBUnmet'] + df['Company_PlasmaUnmet']
@@ -288,17 +304,17 @@ def plot_expired(
         plt.close()
 
 
-def plot_midway_blood_demand(platoons: list[Platoon], save_path="figures/midway_blood_demand.png", show_plot=True):
+def plot_midway_blood_demand(platoons: list[Platoon], save_path="figures/midway_blood_demand.png", show_plot=True, days=100):
     demand = []
     for platoon in platoons:
-        for i in range(100):
-            platoon.updateCombatLevel()
-            cl=platoon.combatLevel
-            if cl<0 or cl>=4:
-                print(f"[ERROR] Invalid combat level {cl} for platoon. List: {platoon.combatLevelList}")
-            demand.append(PlatoonDemand(platoon)[0])
-    
-    demand = np.array(demand)
+        # draw the platoon's combat levels and demand for all days at once with its schedule and demand model
+        levels = samplePaths([platoon.schedule or platoon.combatLevelList], 1, days - 1, platoon.rng)[0, :, 0]
+        invalid = levels[(levels < 0) | (levels >= 4)]
+        if len(invalid) > 0:
+            print(f"[ERROR] Invalid combat level {invalid[0]} for platoon. List: {platoon.combatLevelList}")
+        demand.append(splitDemand(platoon.demandModel.sample(levels, platoon.rng)[1])[0])
+
+    demand = np.concatenate(demand)
     zeros  = np.count_nonzero(demand == 0)
     perZeros = zeros/len(demand)*100
     nonZeroDemand  = demand[demand != 0]